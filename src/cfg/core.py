@@ -3,18 +3,68 @@ and algorithms.'''
 
 import itertools
 import cgi
+import hashlib
+import weakref
 
 from util.tree import Tree
 from util.mixin import Comparable, Keyed, Subscripted, Primed
 
+_interned_symbols = weakref.WeakValueDictionary()
+_interning = True
+
+def set_symbol_interning(enabled):
+    '''Turn symbol interning on or off. While interning is on, constructing a
+    symbol equal to one which is still alive returns the existing instance
+    instead of a new one, so that equal symbols are usually identical. It is on
+    by default.'''
+    global _interning
+    _interning = enabled
+
 class Symbol(Comparable, Keyed):
     '''A base class for symbols which appear in a grammar. Terminal and
-    Nonterminal classes derive from this.'''
+    Nonterminal classes derive from this. Symbols are immutable, and their hash
+    values are computed once on construction.'''
+
+    __slots__ = ('_identifier', '_hash', '__weakref__')
+
+    def __new__(cls, *args):
+        if _interning:
+            key = (cls,) + args
+            try:
+                result = _interned_symbols.get(key)
+            except TypeError:
+                return super(Symbol, cls).__new__(cls)
+            if result is None:
+                result = _interned_symbols[key] = super(Symbol, cls).__new__(cls)
+            return result
+        return super(Symbol, cls).__new__(cls)
 
     def __init__(self, identifier):
         '''Initialize the symbol with a string used to distinguish it.'''
+        if self._initialized():
+            return
         assert isinstance(identifier, str)
         self._identifier = identifier
+        self._hash = hash(self.__key__())
+
+    def _initialized(self):
+        '''Tell whether the symbol has already been initialized. Python calls
+        __init__ on the interned instance which __new__ returns, so
+        constructors return early when this is true.'''
+        return hasattr(self, '_hash')
+
+    def _constructor_args(self):
+        '''Return the arguments with which this symbol can be reconstructed.'''
+        return (self._identifier,)
+
+    def __reduce__(self):
+        return (self.__class__, self._constructor_args())
+
+    def __copy__(self):
+        return self
+
+    def __deepcopy__(self, memo):
+        return self
 
     @property
     def name(self):
@@ -35,10 +85,13 @@ class Symbol(Comparable, Keyed):
     def __eq__(self, y):
         '''Symbols must be of the same class and have the same identifier to be
         considered equal.'''
-        return (
+        return self is y or (
             self.__class__ == y.__class__ and
             self._identifier == y._identifier)
 
+    def __hash__(self):
+        return self._hash
+
     def __key__(self):
         return (self.sort_num(), self.name)
 
@@ -55,6 +108,8 @@ class Symbol(Comparable, Keyed):
 class Nonterminal(Symbol):
     '''A class for nonterminal symbols, or variables, in a grammar.'''
 
+    __slots__ = ()
+
     def __str__(self):
         '''The nonterminal's name appears in angle brackets unless it is a
         single capital letter.'''
@@ -100,12 +155,17 @@ class SubscriptedNonterminal(Subscripted, Nonterminal):
     '''A nonterminal with a subscript.'''
 
     def __init__(self, name, subscript):
+        if self._initialized():
+            return
         Subscripted.__init__(self, subscript)
         Nonterminal.__init__(self, name)
 
     def __repr__(self):
         return 'SubscriptedNonterminal(%r, %r)' % (self.name, self.subscript)
 
+    def _constructor_args(self):
+        return (self.name, self.subscript)
+
     def html(self):
         return self.html_after('<sub>%s</sub>' % cgi.escape(str(self.subscript)))
 
@@ -117,12 +177,17 @@ class PrimedNonterminal(Primed, Nonterminal):
     '''A nonterminal with some number of "prime" marks.'''
 
     def __init__(self, name, num_primes):
+        if self._initialized():
+            return
         Primed.__init__(self, num_primes)
         Nonterminal.__init__(self, name)
 
     def __repr__(self):
         return 'PrimedNonterminal(%r, %r)' % (self.name, self.num_primes)
 
+    def _constructor_args(self):
+        return (self.name, self.num_primes)
+
     def html(self):
         if self.num_primes == 2:
             primestr = '&Prime;' # double prime
@@ -144,6 +209,8 @@ class PrimedNonterminal(Primed, Nonterminal):
 class Terminal(Symbol):
     '''A class for terminal symbols in a grammar.'''
 
+    __slots__ = ()
+
     def __str__(self):
         '''The terminal's identifier appears in double quotes unless it is a
         single lowercase letter.s'''
@@ -171,6 +238,8 @@ class Marker(Terminal):
     of input tapes, etc. Traditionally represented as $, but may be initialized
     with any identifier. It is equal to no terminal symbol.'''
 
+    __slots__ = ()
+
     def html(self):
         if len(self.name) == 1:
             return cgi.escape(self.name)
@@ -181,9 +250,14 @@ class Marker(Terminal):
 
 class Epsilon(Terminal):
 
+    __slots__ = ()
+
     def __init__(self):
         super(Epsilon, self).__init__('')
 
+    def _constructor_args(self):
+        return ()
+
     def html(self):
         return '<i>&epsilon;</i>'
 
@@ -247,7 +321,27 @@ class ProductionRule(object):
         return self._html(lambda x: x.dot_html())
 
 class ParseTree(Tree(Symbol)):
-    '''A class for parse trees or syntax trees.'''
+    '''A class for parse trees or syntax trees. A parse tree produced by a
+    parser may record the span of input it covers, from position start up to
+    but not including position end. The span does not take part in
+    comparisons between trees.'''
+
+    def __init__(self, value, subtrees=None, start=None, end=None):
+        super(ParseTree, self).__init__(value, subtrees)
+        self._start = start
+        self._end = end
+
+    @property
+    def start(self):
+        '''Return the input position at which the tree's span starts, or
+        None if it is not known.'''
+        return self._start
+
+    @property
+    def end(self):
+        '''Return the input position at which the tree's span ends, or None
+        if it is not known.'''
+        return self._end
 
     @property
     def symbol(self):
@@ -276,6 +370,7 @@ class ContextFreeGrammar(object):
             The CFG's nonterminals (Nu), terminals (Sigma), production rules
             (P), and start variable (S) are explicitly given and checked for
             correctness.'''
+        self._indexes_built = False
         if len(args) == 1:
             if isinstance(args[0], str):
                 self._init_string(*args)
@@ -292,15 +387,12 @@ class ContextFreeGrammar(object):
     def nonterminals(self):
         '''Return a set of the nonterminal symbols which appear in the grammar.
         '''
-        return self._get_symbols_of_type(Nonterminal) | \
-               set(p.left_side for p in self._productions) | \
-               self._extra_nonterminals
+        return self._indexed()._nonterminal_set
     
     @property
     def terminals(self):
         '''Return a set of the terminal symbols which appear in the grammar.'''
-        return self._get_symbols_of_type(Terminal) | \
-               self._extra_terminals
+        return self._indexed()._terminal_set
 
     @property
     def productions(self):
@@ -315,12 +407,21 @@ class ContextFreeGrammar(object):
     @property
     def symbols(self):
         '''Return a list of the grammar's nonterminals and terminals.'''
-        return self.nonterminals | self.terminals
+        return self._indexed()._symbol_set
 
     def productions_with_left_side(self, left_side):
         '''Return all production rules in the grammar with a certain
         symbol on the left side.'''
-        return filter(lambda x: x.left_side == left_side, self.productions)
+        return list(self._indexed()._left_side_index.get(left_side, ()))
+
+    def production_index(self, production):
+        '''Return the position of a production rule in the list of the
+        grammar's productions. Raise a ValueError if it is not in the grammar.
+        '''
+        try:
+            return self._indexed()._production_indexes[production]
+        except KeyError:
+            raise ValueError('%s is not a production rule of the grammar' % production)
 
     def production_dict(self):
         '''Return a mapping of variables to the sentences they produce, in
@@ -330,6 +431,67 @@ class ContextFreeGrammar(object):
             result[p.left_side].append(p.right_side)
         return result
 
+    def fingerprint(self):
+        '''Return a hexadecimal digest of the grammar's start variable,
+        production rules, and any symbols which appear in no production rule.
+        Equal grammars have the same fingerprint, and any change to the
+        grammar changes it, so it can be used to look up artifacts computed
+        from the grammar. Like the grammar's indexes, it is computed once and
+        kept until invalidate is called.'''
+        self._indexed()
+        if self._fingerprint is None:
+            self._fingerprint = self._compute_fingerprint()
+        return self._fingerprint
+
+    def _compute_fingerprint(self):
+        lines = ['start %r' % (self._start,)]
+        lines.extend(sorted('extra %r' % (X,) for X in
+                     self._extra_nonterminals | self._extra_terminals))
+        lines.extend('rule %r %r' % (p.left_side, list(p.right_side))
+                     for p in self._productions)
+        return hashlib.sha1('\n'.join(lines)).hexdigest()
+
+    def freeze(self):
+        '''Build the grammar's symbol sets and production indexes now rather
+        than on first use, and return the grammar.
+
+        The grammar is treated as immutable. Its symbol sets, its index of
+        productions by left side, and its production numbering are computed
+        once, the first time any of them is needed, in time linear in the size
+        of the grammar. Code which modifies the list of productions must call
+        invalidate afterwards.'''
+        return self._indexed()
+
+    def invalidate(self):
+        '''Discard the grammar's cached symbol sets, production indexes, and
+        fingerprint after its list of productions has been modified.'''
+        self._indexes_built = False
+
+    def _indexed(self):
+        if not self._indexes_built:
+            self._build_indexes()
+        return self
+
+    def _build_indexes(self):
+        nonterminals = set(self._extra_nonterminals)
+        terminals = set(self._extra_terminals)
+        left_side_index = {}
+        production_indexes = {}
+        for i, p in enumerate(self._productions):
+            nonterminals.add(p.left_side)
+            for X in p.right_side:
+                if isinstance(X, Nonterminal): nonterminals.add(X)
+                elif isinstance(X, Terminal): terminals.add(X)
+            left_side_index.setdefault(p.left_side, []).append(p)
+            production_indexes.setdefault(p, i)
+        self._nonterminal_set = frozenset(nonterminals)
+        self._terminal_set = frozenset(terminals)
+        self._symbol_set = self._nonterminal_set | self._terminal_set
+        self._left_side_index = left_side_index
+        self._production_indexes = production_indexes
+        self._fingerprint = None
+        self._indexes_built = True
+
     def _get_symbols_of_type(self, T):
         return set(s for p in self._productions for s in p.right_side \
                    if isinstance(s, T))
@@ -0,0 +1,244 @@
+'''The Cocke-Younger-Kasami algorithm for grammars in Chomsky normal form,
+such as those produced by cnf.ChomskyNormalForm, with its chart stored in
+NumPy arrays.
+
+The chart of an input string of length n is an array of bools of shape
+(n, n, m), where m is the number of nonterminals, whose entry [i, l - 1, A]
+tells whether nonterminal A derives the l symbols of input starting at
+position i, so it takes n * n * m bytes. The binary rules A -> BC are
+indexed by their pairs (B, C) of right side symbols. Each span length is
+filled in at once: a batched matrix product counts, for every span and every
+pair (B, C), the ways of splitting the span into a part derived from B and a
+part derived from C, and a second matrix product maps the pairs which occur
+to their left sides. For spans of length l, the left and right parts of the
+splits are copied out of the chart as float32 arrays of shape (n - l + 1,
+l - 1, m) for the product, so the temporary arrays peak at about twice the
+size of the chart, for l near n / 2.'''
+
+import numpy
+from cfg.core import ParseTree
+from cfg.cnf import is_cnf
+from cfg.glr import InputNotRecognized
+
+class CYKGrammar(object):
+    '''A grammar in Chomsky normal form compiled into arrays for the CYK
+    algorithm. Nonterminals are numbered in sorted order.'''
+
+    def __init__(self, grammar):
+        '''Compile a grammar. Raise a ValueError if it is not in Chomsky
+        normal form. As in aho_ullman, the start symbol may appear on the
+        right side of a rule as long as the grammar has no empty rule.'''
+        if not (is_cnf(grammar) or all(_is_cyk_rule(p)
+                                       for p in grammar.productions)):
+            raise ValueError('grammar is not in Chomsky normal form')
+        self._grammar = grammar
+        self._nonterminals = sorted(grammar.nonterminals)
+        ids = { A : i for i, A in enumerate(self._nonterminals) }
+        m = len(self._nonterminals)
+        self._start = ids[grammar.start]
+        self._accepts_empty = False
+        # The nonterminals which derive each terminal, as rows of the chart.
+        self._terminal_rows = {}
+        # The pairs of right side symbols of the binary rules of each
+        # nonterminal, in the order of the rules, for building trees.
+        self._binary_rules = [[] for A in self._nonterminals]
+        heads = {}
+        for p in grammar.productions:
+            A = ids[p.left_side]
+            rs = p.right_side
+            if not rs:
+                self._accepts_empty = True
+            elif len(rs) == 1:
+                row = self._terminal_rows.get(rs[0])
+                if row is None:
+                    row = self._terminal_rows[rs[0]] = numpy.zeros(m, bool)
+                row[A] = True
+            else:
+                pair = ids[rs[0]], ids[rs[1]]
+                self._binary_rules[A].append(pair)
+                heads.setdefault(pair, set()).add(A)
+        pairs = sorted(heads)
+        self._left = numpy.array([B for B, C in pairs], numpy.intp)
+        self._right = numpy.array([C for B, C in pairs], numpy.intp)
+        self._heads = numpy.zeros((len(pairs), m), numpy.float32)
+        for j, pair in enumerate(pairs):
+            self._heads[j, list(heads[pair])] = 1
+
+    @property
+    def grammar(self):
+        '''Return the grammar which was compiled.'''
+        return self._grammar
+
+    @property
+    def nonterminals(self):
+        '''Return the list of nonterminals, in the order of their numbers.'''
+        return self._nonterminals
+
+    @property
+    def start_index(self):
+        '''Return the number of the start symbol.'''
+        return self._start
+
+    @property
+    def accepts_empty(self):
+        '''Tell whether the grammar derives the empty string.'''
+        return self._accepts_empty
+
+    def terminal_row(self, terminal):
+        '''Return an array of bools, indexed by the numbers of the
+        nonterminals, telling which nonterminals derive a terminal, or None
+        if no rule derives it.'''
+        return self._terminal_rows.get(terminal)
+
+    @property
+    def rule_pairs(self):
+        '''Return the distinct pairs (B, C) of right side symbols of the
+        binary rules A -> BC, in sorted order, as two arrays of nonterminal
+        numbers, one of the Bs and one of the Cs.'''
+        return self._left, self._right
+
+    @property
+    def rule_heads(self):
+        '''Return the float32 matrix whose entry [j, A] is 1 if A -> BC is a
+        rule, where (B, C) is the jth pair of rule_pairs, and 0 otherwise.'''
+        return self._heads
+
+    def chart(self, input_string):
+        '''Compute the chart of an input string of Terminals, as described
+        above. Raise InputNotRecognized if the input contains a symbol which
+        no rule derives.'''
+        w = list(input_string)
+        chart = self._initial_chart(w)
+        for l in xrange(2, len(w) + 1):
+            self._fill(chart, l, self._span_rows(chart, l, self._heads))
+        return chart
+
+    def recognize(self, input_string):
+        '''Decide whether an input string of Terminals is in the language of
+        the grammar. No parse tree is built, and of the entries for the whole
+        input, only that of the start symbol is computed.'''
+        w = list(input_string)
+        n = len(w)
+        if n == 0:
+            return self._accepts_empty
+        try:
+            chart = self._initial_chart(w)
+        except InputNotRecognized:
+            return False
+        if n == 1:
+            return bool(chart[0, 0, self._start])
+        for l in xrange(2, n):
+            self._fill(chart, l, self._span_rows(chart, l, self._heads))
+        return bool(self._span_rows(chart, n, self._heads[:, [self._start]]))
+
+    def parse(self, input_string):
+        '''Parse an input string of Terminals and return one of its parse
+        trees, recording the span of input covered by each node. Among the
+        ways of deriving each node, the one with the shortest first part and,
+        after that, the earliest rule is chosen. Raise InputNotRecognized if
+        the string is not in the language of the grammar.'''
+        w = list(input_string)
+        n = len(w)
+        if n == 0:
+            if not self._accepts_empty:
+                raise InputNotRecognized('empty input is not recognized')
+            return ParseTree(self._grammar.start, None, 0, 0)
+        chart = self.chart(w)
+        if not chart[0, n - 1, self._start]:
+            raise InputNotRecognized('input is not recognized')
+        return self._tree(chart, w)
+
+    def _initial_chart(self, w):
+        # Make the chart with the spans of length 1 filled in. Raise
+        # InputNotRecognized if the input contains a symbol which no rule
+        # derives.
+        n = len(w)
+        chart = numpy.zeros((n, n, len(self._nonterminals)), bool)
+        for i, a in enumerate(w):
+            row = self._terminal_rows.get(a)
+            if row is None:
+                raise InputNotRecognized('no rule derives %s' % (a,))
+            chart[i, 0] = row
+        return chart
+
+    def _fill(self, chart, l, rows):
+        # Store the entries of the spans of length l.
+        chart[:chart.shape[0] - l + 1, l - 1] = rows
+
+    def _span_rows(self, chart, l, heads):
+        # Compute the entries for all spans of length l, given those of the
+        # shorter spans, for the left sides which are the columns of heads.
+        # The split of the span at i after its first k symbols has its left
+        # part at [i, k - 1] and its right part at [i + k, l - k - 1]. Entry
+        # [i, B, C] of the product counts the splits of the span at i into a
+        # part derived from B and a part derived from C.
+        if not len(self._left):
+            return False
+        s = chart.shape[0] - l + 1
+        k = numpy.arange(1, l)
+        left = chart[:s, :l - 1].transpose(0, 2, 1).astype(numpy.float32)
+        right = chart[numpy.arange(s)[:, None] + k, l - 1 - k]
+        counts = numpy.matmul(left, right.astype(numpy.float32))
+        found = counts[:, self._left, self._right] > 0
+        return numpy.dot(found.astype(numpy.float32), heads) > 0
+
+    def _tree(self, chart, w):
+        # Choose the derivation of each node from the top down, listing the
+        # nodes in preorder, then build the trees from the bottom up. An
+        # explicit stack is used so that long inputs do not exhaust the
+        # recursion limit.
+        nodes = []
+        agenda = [(self._start, 0, len(w))]
+        while agenda:
+            A, i, l = agenda.pop()
+            if l == 1:
+                nodes.append((self._nonterminals[A], i, l, 1))
+                nodes.append((w[i], i, l, 0))
+                continue
+            for B, C, k in self._splits(chart, A, i, l):
+                nodes.append((self._nonterminals[A], i, l, 2))
+                agenda.append((C, i + k, l - k))
+                agenda.append((B, i, k))
+                break
+        trees = []
+        for X, i, l, num_children in reversed(nodes):
+            subtrees = [trees.pop() for j in xrange(num_children)]
+            trees.append(ParseTree(X, subtrees, i, i + l))
+        return trees[0]
+
+    def _splits(self, chart, A, i, l):
+        # Generate the triples (B, C, k) such that A -> BC, B derives the
+        # first k symbols of the span, and C derives the rest.
+        for k in xrange(1, l):
+            for B, C in self._binary_rules[A]:
+                if chart[i, k - 1, B] and chart[i + k, l - k - 1, C]:
+                    yield B, C, k
+
+def _is_cyk_rule(p):
+    rs = p.right_side
+    return (len(rs) == 1 and rs[0].is_terminal()) or \
+           (len(rs) == 2 and rs[0].is_nonterminal() and rs[1].is_nonterminal())
+
+def compile_grammar(grammar):
+    '''Return a CYKGrammar for a grammar in Chomsky normal form, or the
+    grammar itself if it is already a CYKGrammar.'''
+    if isinstance(grammar, CYKGrammar):
+        return grammar
+    return CYKGrammar(grammar)
+
+def cyk_chart(grammar, input_string):
+    '''Compute the CYK chart of an input string of Terminals with respect to
+    a grammar in Chomsky normal form or a CYKGrammar.'''
+    return compile_grammar(grammar).chart(input_string)
+
+def recognize(grammar, input_string):
+    '''Decide whether an input string of Terminals is in the language of a
+    grammar in Chomsky normal form or a CYKGrammar, without building a parse
+    tree.'''
+    return compile_grammar(grammar).recognize(input_string)
+
+def parse(grammar, input_string):
+    '''Return a parse tree of an input string of Terminals with respect to a
+    grammar in Chomsky normal form or a CYKGrammar. Raise InputNotRecognized
+    if the grammar does not recognize the input.'''
+    return compile_grammar(grammar).parse(input_string)
@@ -1,39 +1,277 @@
 import sys
+import heapq
+import multiprocessing
 from collections import deque
-from itertools import chain
 from util.mixin import Keyed, Comparable
-from util.moreitertools import alternations
-from cfg.core import ParseTree
-from cfg.table import build_slr_table, END_MARKER
+from util.digraph import strongly_connected_components
+from util.lrucache import LRUCache
+from cfg.core import ParseTree, ProductionRule
+from cfg.table import build_table, END_MARKER
 
 class InputNotRecognized(Exception):
     '''An exception indicating that the input string to a parsing algorithm is
     not recognized by the parser.'''
     pass
 
-def enumerate_trees(v):
-    '''Given a vertex from a packed shared parse forest, enumerate all of the
-    parse trees encoded therein. Cyclic parses are encoded as cyclic trees.'''
-    return _enumerate_trees(v, {})
+def enumerate_trees(v, limit=None):
+    '''Given a vertex from a packed shared parse forest, lazily enumerate the
+    parse trees encoded therein, stopping after limit trees if a limit is
+    given. Before the first tree, the vertices on cycles are found in time
+    linear in the size of the part of the forest reachable from v. After
+    that, trees are built one at a time; in an acyclic forest, each one takes
+    time linear in its size and the numbers of alternatives of its vertices,
+    however ambiguous the forest is. A cyclic forest encodes infinitely many
+    trees; only those in which no vertex appears again inside its own subtree
+    are enumerated.'''
+    if limit is not None and limit <= 0:
+        return
+    cyclic = _cyclic_vertices(v)
+    # Trees are found by a depth-first search with backtracking. A search
+    # state consists of the vertices left to expand and the choices of
+    # alternatives made so far, both kept as linked tuples so that states
+    # share structure. The last child of a vertex is expanded first, so the
+    # choices for its first child vary the fastest.
+    count = 0
+    stack = [(((v, frozenset()), None), None)]
+    while stack:
+        todo, choices = stack.pop()
+        if todo is None:
+            yield _build_tree(choices)
+            count += 1
+            if count == limit:
+                return
+            continue
+        (u, above), rest = todo
+        if not u.children:
+            stack.append((rest, (u, None, choices)))
+            continue
+        if u in cyclic:
+            above = above | frozenset([u])
+        for alt in reversed(u.children):
+            if above and any(c in above for c in alt):
+                continue
+            expanded = rest
+            for c in alt:
+                expanded = ((c, above), expanded)
+            stack.append((expanded, (u, alt, choices)))
 
-def _enumerate_trees(v, seen):
-    if v.children:
-        for child_set in v.children:
-            for alt in alternations(map(lambda x: list(_enumerate_trees(x, seen)), child_set)):
-                yield ParseTree(v.symbol, alt)
-    else:
-        yield ParseTree(v.symbol)
+def _build_tree(choices):
+    # Build the parse tree described by a linked tuple of choices made by
+    # enumerate_trees, the most recent first. Each completed vertex yields a
+    # list of trees, which has more than one element only for intermediate
+    # vertices, so that their sequences are spliced into their parents.
+    sequence = []
+    while choices is not None:
+        u, alt, choices = choices
+        sequence.append((u, alt))
+    sequence.reverse()
+    frames = []
+    for u, alt in sequence:
+        if alt:
+            frames.append((u, [], len(alt)))
+            continue
+        trees = [ParseTree(u.symbol, None, u.start, u.end)]
+        while frames:
+            w, parts, n = frames[-1]
+            parts.append(trees)
+            if len(parts) < n:
+                break
+            frames.pop()
+            trees = [t for part in reversed(parts) for t in part]
+            if not w.intermediate:
+                trees = [ParseTree(w.symbol, trees, w.start, w.end)]
+        else:
+            return trees[0]
+
+def best_trees(v, k, score):
+    '''Return the k best parse trees encoded in a packed shared parse forest,
+    as a list of (score, tree) pairs in order of decreasing score. The score
+    of a tree is the sum of score(rule) over the production rules used at its
+    internal nodes. The k best subtrees of every vertex are combined
+    bottom-up, one strongly connected component of the forest at a time, in
+    time linear in the size of an acyclic forest for a fixed k. The vertices
+    of a cycle are instead updated from each other until their k best
+    subtrees no longer improve, which ends because going around a cycle
+    cannot raise a score as long as the rules of the cycle have scores of at
+    most 0, as log probabilities do; a ValueError is raised if one of them
+    has a positive score. In a cyclic forest, trees in which a vertex appears
+    again inside its own subtree are ranked along with the others.'''
+    best = {}
+    for component in strongly_connected_components([v], forest_successors):
+        if not is_cycle(component):
+            u, = component
+            best[u] = _best_alternatives(u, best, k, score)
+            continue
+        # Bellman-Ford style relaxation: a vertex is recomputed whenever the
+        # best subtrees of one of its children in the component change.
+        members = set(component)
+        parents = {}
+        for u in component:
+            best[u] = []
+            for alt in u.children:
+                if any(c in members for c in alt):
+                    if not u.intermediate and score(ProductionRule(
+                            u.symbol, alternative_symbols(alt))) > 0:
+                        raise ValueError('a rule on a cycle of the forest '
+                                         'has a positive score')
+                    for c in alt:
+                        if c in members:
+                            parents.setdefault(c, []).append(u)
+        agenda = list(component)
+        queued = set(component)
+        while agenda:
+            u = agenda.pop()
+            queued.discard(u)
+            candidates = _best_alternatives(u, best, k, score)
+            if [x for x, t in candidates] == [x for x, t in best[u]]:
+                continue
+            best[u] = candidates
+            for w in parents.get(u, ()):
+                if w not in queued:
+                    queued.add(w)
+                    agenda.append(w)
+    return [(total, trees[0]) for total, trees in best[v]]
+
+def _best_alternatives(u, best, k, score):
+    # Combine the best subtrees of the children of u into its k best
+    # subtrees, as a list of (score, trees) pairs in order of decreasing
+    # score. The lists of trees have more than one element only for
+    # intermediate vertices, whose sequences are spliced into their parents.
+    if not u.children:
+        return [(0, [ParseTree(u.symbol, None, u.start, u.end)])]
+    candidates = []
+    for alt in u.children:
+        base = None
+        for total, parts in _best_combinations([best[c] for c in alt], k):
+            subtrees = [t for part in parts for t in part]
+            if u.intermediate:
+                candidates.append((total, subtrees))
+                continue
+            if base is None:
+                base = score(ProductionRule(
+                    u.symbol, [t.symbol for t in subtrees]))
+            candidates.append((base + total,
+                               [ParseTree(u.symbol, subtrees, u.start, u.end)]))
+    candidates.sort(key=lambda x: -x[0])
+    return candidates[:k]
+
+def count_trees(v):
+    '''Count the parse trees encoded in a packed shared parse forest without
+    building them. Each vertex is visited once, so the running time is linear
+    in the size of the forest, and the count is an exact integer however large
+    it is. If the forest is cyclic, the input is infinitely ambiguous, and
+    float('inf') is returned.'''
+    counts = {}
+    for component in strongly_connected_components([v], forest_successors):
+        if is_cycle(component):
+            # Every vertex on a cycle which derives any tree at all derives
+            # infinitely many.
+            members = set(component)
+            productive = any(
+                all(c not in members and counts[c] != 0 for c in alt)
+                for u in component for alt in u.children)
+            for u in component:
+                counts[u] = float('inf') if productive else 0
+            continue
+        u, = component
+        if not u.children:
+            counts[u] = 1
+            continue
+        total = 0
+        for alt in u.children:
+            factors = [counts[c] for c in alt]
+            if 0 in factors:
+                continue
+            if float('inf') in factors:
+                total = float('inf')
+                continue
+            product = 1
+            for n in factors:
+                product *= n
+            total += product
+        counts[u] = total
+    return counts[v]
+
+def _best_combinations(lists, k):
+    # Yield the k best combinations of one item from each of several lists
+    # of (score, tree) pairs sorted by decreasing score, as pairs of a total
+    # score and a list of trees, in order of decreasing total score.
+    if not all(lists):
+        return
+    start = (0,) * len(lists)
+    heap = [(-sum(l[0][0] for l in lists), start)]
+    seen = set([start])
+    while heap and k > 0:
+        total, indexes = heapq.heappop(heap)
+        yield -total, [l[i][1] for l, i in zip(lists, indexes)]
+        k -= 1
+        for j, l in enumerate(lists):
+            if indexes[j] + 1 < len(l):
+                successor = indexes[:j] + (indexes[j] + 1,) + indexes[j + 1:]
+                if successor not in seen:
+                    seen.add(successor)
+                    heapq.heappush(heap, (total + l[indexes[j]][0] - l[indexes[j] + 1][0], successor))
+
+def _tree_score(tree, score):
+    result = 0
+    stack = [tree]
+    while stack:
+        t = stack.pop()
+        if t.subtrees or t.symbol.is_nonterminal():
+            result += score(ProductionRule(t.symbol, [c.symbol for c in t.subtrees]))
+            stack.extend(t.subtrees)
+    return result
+
+def forest_successors(v):
+    '''List the children of all of the alternatives of a vertex, so that a
+    forest can be searched as a directed graph, for instance with
+    util.digraph.strongly_connected_components, which lists the components
+    of a forest with every vertex after the vertices it leads to.'''
+    return [c for alt in v.children for c in alt]
+
+def is_cycle(component):
+    '''Tell whether a strongly connected component of a forest, given as a
+    list of vertices, contains a cycle.'''
+    return len(component) > 1 or \
+        any(c is component[0] for c in forest_successors(component[0]))
+
+def alternative_symbols(alt):
+    '''List the symbols of the right side of the rule used by an alternative
+    of a vertex, with each intermediate vertex replaced by the symbols of the
+    sequence it stands for, which are the same in all of its alternatives.'''
+    result = []
+    stack = list(reversed(alt))
+    while stack:
+        c = stack.pop()
+        if c.intermediate:
+            stack.extend(reversed(c.children[0]))
+        else:
+            result.append(c.symbol)
+    return result
+
+def _cyclic_vertices(v):
+    # Return the set of vertices reachable from v which lie on a cycle.
+    result = set()
+    for component in strongly_connected_components([v], forest_successors):
+        if is_cycle(component):
+            result.update(component)
+    return result
 
 class Node(Comparable, Keyed):
-    '''A node in the parse graph of the GLR algorithm.'''
+    '''A node in the parse graph of the GLR algorithm, labelled with a parser
+    state and the number of input symbols read when it was created.'''
 
-    def __init__(self, state, cnode=None, cvertex=None):
+    def __init__(self, state, cnode=None, cvertex=None, level=0):
         self._state = state
+        self._level = level
         self._children = [] if cnode is None else [(cnode, cvertex)]
 
     @property
     def state(self): return self._state
 
+    @property
+    def level(self): return self._level
+
     @property
     def children(self): return self._children
 
@@ -46,15 +284,33 @@ class Node(Comparable, Keyed):
 
 class Vertex(Comparable, Keyed):
     '''A vertex in the packed shared parse forest generated by the GLR
-    algorithm.'''
+    algorithm. The vertex covers the input symbols from position start up to
+    but not including position end, if these are known, or None otherwise.
+
+    A vertex whose intermediate attribute is true stands for a sequence of
+    vertices rather than a node of a parse tree, and each of its alternatives
+    is a way of deriving that sequence. Such vertices are created by the
+    BRNGLR algorithm to keep the forest small, and the sequences they stand
+    for are spliced into the alternatives which contain them whenever trees
+    are built from the forest.'''
+
+    intermediate = False
 
-    def __init__(self, symbol, children=None):
+    def __init__(self, symbol, children=None, start=None, end=None):
         self._symbol = symbol
         self._children = [] if children is None else [children]
+        self._start = start
+        self._end = end
 
     @property
     def symbol(self): return self._symbol
 
+    @property
+    def start(self): return self._start
+
+    @property
+    def end(self): return self._end
+
     @property
     def children(self): return self._children
 
@@ -70,89 +326,492 @@ def glr_parse(table, input_string):
     Vertex objects representing the roots of the packed shared parse forest
     generated by the algorithm. If the string is not recognized, raise an
     InputNotRecognized error.'''
+    session = GLRSession(table)
+    for a in input_string:
+        session.feed(a)
+    return session.finish()
+
+def _intern_input(table, input_string):
+    for a in input_string:
+        i = table.terminal_id(a)
+        if i is None:
+            raise InputNotRecognized('%s is not a terminal of the grammar' % a)
+        yield i
+
+def _path_list(path):
+    # Convert a path of vertices stored as linked tuples into a list.
+    result = []
+    while path is not None:
+        vertex, path = path
+        result.append(vertex)
+    return result
+
+def glr_parse_ids(table, input_ids):
+    '''Parse a sequence of terminal numbers with respect to a
+    CompiledParseTable using the GLR algorithm. The input must not include the
+    end marker. The result is the same as that of glr_parse.'''
+    session = GLRSession(table)
+    for ai in input_ids:
+        session.feed_id(ai)
+    return session.finish()
+
+class GLRSession(object):
+    '''A GLR parse which reads its input one token at a time, so that input
+    which is not available all at once can be parsed as it arrives. Each token
+    is parsed as soon as it is fed, in time which does not depend on the
+    length of the input read before it, and an InputNotRecognized error is
+    raised by the first token which cannot be part of any string in the
+    language. After an error, the session is no longer viable and accepts no
+    more input unless it is restored from a snapshot.
+
+    A snapshot records the top of the graph structured stack between two
+    tokens. Restoring it returns the session to that point, discarding the
+    tokens fed since, and a snapshot may be restored any number of times.'''
+
+    def __init__(self, table):
+        '''Begin parsing with respect to a parse table, which is compiled if
+        it is not already.'''
+        self._table = table.compile()
+        self._max_length = max([0] + [self._table.rule_length(p)
+            for p in xrange(len(self._table.productions))])
+        self._level = 0
+        self._frontier = { 0 : Node(0) }
+        self._finished = False
+
+    @property
+    def table(self):
+        '''Return the CompiledParseTable used by the session.'''
+        return self._table
+
+    @property
+    def level(self):
+        '''Return the number of tokens read so far.'''
+        return self._level
+
+    @property
+    def viable(self):
+        '''Tell whether the tokens read so far are a prefix of some string in
+        the language, so that parsing may continue.'''
+        return bool(self._frontier)
+
+    def feed(self, token):
+        '''Read the next Terminal of the input.'''
+        i = self._table.terminal_id(token)
+        if i is None:
+            self._check_open()
+            self._frontier = {}
+            raise InputNotRecognized('%s is not a terminal of the grammar' % token)
+        self.feed_id(i)
+
+    def feed_id(self, ai):
+        '''Read the next token of the input, given as a terminal number.'''
+        self._check_open()
+        accepted, shifts = self._reduce(ai)
+        U = self._frontier = {}
+        if not shifts:
+            raise InputNotRecognized('the input string is not recognized by the grammar')
+        level = self._level
+        x = Vertex(self._table.terminals[ai], None, level, level + 1)
+        for v, s in shifts:
+            if s in U:
+                U[s].link_to(v, x)
+            else:
+                U[s] = Node(s, v, x, level + 1)
+        self._level = level + 1
+
+    def finish(self):
+        '''Signal the end of the input. Return the roots of the packed shared
+        parse forest of the input, as in glr_parse, or raise
+        InputNotRecognized if the input is not recognized. No more input may
+        be read afterwards.'''
+        self._check_open()
+        self._finished = True
+        r, shifts = self._reduce(self._table.end_marker_id)
+        if r is None:
+            self._frontier = {}
+            raise InputNotRecognized('the input string is not recognized by the grammar')
+        roots = []
+        for cnode, cvertex in r.children:
+            if not any(cvertex is x for x in roots):
+                roots.append(cvertex)
+        return roots
+
+    def snapshot(self):
+        '''Return an opaque object recording the state of the parse, which
+        may be passed to restore.'''
+        self._check_open()
+        return (self._level,
+                [(u.state, list(u.children)) for u in self._frontier.itervalues()])
+
+    def restore(self, snapshot):
+        '''Return the parse to the state recorded in a snapshot taken from a
+        session with the same table.'''
+        level, frontier = snapshot
+        # The nodes at the top of the stack gain links while the next token
+        # is parsed, so they are copied; everything below them is final.
+        U = {}
+        for state, children in frontier:
+            u = U[state] = Node(state, None, None, level)
+            u.children.extend(children)
+        self._level = level
+        self._frontier = U
+        self._finished = False
+
+    def _check_open(self):
+        if self._finished:
+            raise ValueError('the end of the input has already been read')
+        if not self._frontier:
+            raise InputNotRecognized('the input string is not recognized by the grammar')
+
+    def _reduce(self, ai):
+        # Perform all reductions in the current level with lookahead ai.
+        # Return the node which accepts the input, if any, and a list of the
+        # shifts of ai as pairs of a node and a state.
+        table = self._table
+        productions = table.productions
+        get_reductions = table.get_reductions
+        get_goto = table.get_goto
+        get_shift = table.get_shift
+        rule_length = table.rule_length
+        NO_STATE = table.NO_STATE
+        max_length = self._max_length
+        level = self._level
+        U = self._frontier
+
+        def enqueue_paths(node, production, through=None):
+            # Enqueue a reduction for every path of the length of the
+            # production leading back from node, or only for those passing
+            # through the link given by a pair of nodes through if it is given.
+            # A link is identified by its nodes rather than its vertex, since
+            # vertices are shared between links. Paths are built as linked
+            # tuples of the form (vertex, rest) so that they share their common
+            # suffixes, and children are visited in order using an explicit
+            # stack.
+            through_node, through_child = through or (None, None)
+            stack = [(node, rule_length(production), None, through is None)]
+            while stack:
+                node, length, path, passed = stack.pop()
+                if length > 0:
+                    length -= 1
+                    on_link = node is through_node
+                    for cnode, cvertex in reversed(node.children):
+                        stack.append((cnode, length, (cvertex, path), passed or
+                                      (on_link and cnode is through_child)))
+                elif passed:
+                    R.append((node, production, path))
+
+        def shared_vertex(N, start, path):
+            # Return the vertex of this level for symbol N starting at position
+            # start, adding path to its alternatives unless it already has it.
+            key = (N, start)
+            z = vertices.get(key)
+            if z is None:
+                z = vertices[key] = Vertex(N, None, start, level)
+                alternatives[key] = set()
+            path_key = tuple(map(id, path))
+            if path_key not in alternatives[key]:
+                alternatives[key].add(path_key)
+                z.add_children(path)
+            return z
+
+        def reexamine(u, w):
+            # A link from node u to node w has just been added in the current
+            # level. Only paths which pass through it need to be reduced, and a
+            # reduction of length m from node v can pass through it only if u
+            # is fewer than m links away from v within the current level. Find
+            # the nodes within reach of u by walking the level's links
+            # backwards, and redo the reductions of those which have already
+            # been processed.
+            distance = 0
+            frontier = [u]
+            seen = set(frontier)
+            while frontier and distance < max_length:
+                for v in frontier:
+                    for m, q in processed.get(v, ()):
+                        if m <= distance: break
+                        enqueue_paths(v, q, (u, w))
+                distance += 1
+                next_frontier = []
+                for v in frontier:
+                    for parent in parents.get(v, ()):
+                        if parent not in seen:
+                            seen.add(parent)
+                            next_frontier.append(parent)
+                frontier = next_frontier
 
-    def enqueue_paths(node, production):
-        def r(node, length, path):
-            if length > 0:
-                for child, vertex in node.children:
-                    path[length - 1] = vertex
-                    r(child, length - 1, path)
-            else: R.append((node, production, path[:]))
-        length = len(production.right_side)
-        r(node, length, [None] * length)
-
-    def enqueue_paths_through(node, production, vertex):
-        def r(node, length, passed, path):
-            if length > 0:
-                for cnode, cvertex in node.children:
-                    path[length - 1] = cvertex
-                    r(cnode, length - 1, passed or cvertex is vertex, path)
-            elif passed:
-                R.append((node, production, path[:]))
-        length = len(production.right_side)
-        r(node, length, False, [None] * length)
-
-    U = { 0 : Node(0) }
-    R = deque()
-    Q = deque()
-    r = None
-    for ai in chain(input_string, [END_MARKER]):
         A = deque(U.values())
+        R = deque()
+        Q = []
+        r = None
+        # Map each symbol and start position to the vertex of this level
+        # which covers the input from there, and to the keys of its
+        # alternatives, so that each (symbol, span) has a single vertex.
+        vertices = {}
+        alternatives = {}
+        # Map each processed node of this level to its nonempty reductions
+        # on the current terminal in order of decreasing length.
+        processed = {}
+        # Map each node of this level to the nodes of this level which link
+        # to it.
+        parents = {}
         while True:
             if A:
                 v = A.popleft()
                 if table.has_accept(v.state, ai): r = v
-                Q.extend((v, s) for s in table.get_shifts(v.state, ai))
-                for p in table.get_reductions(v.state, ai):
+                s = get_shift(v.state, ai)
+                if s != NO_STATE: Q.append((v, s))
+                reductions = get_reductions(v.state, ai)
+                for p in reductions:
                     enqueue_paths(v, p)
+                processed[v] = sorted(((rule_length(p), p) for p in reductions
+                                       if rule_length(p) > 0), reverse=True)
             elif R:
                 w, p, path = R.popleft()
-                N = p.left_side
-                s = table.get_goto(w.state, N)
+                path = _path_list(path)
+                N = productions[p].left_side
+                s = get_goto(w.state, table.left_side_id(p))
+                z = shared_vertex(N, w.level, path)
                 if s in U:
                     u = U[s]
-                    for cnode, z in u.children:
+                    for cnode, x in u.children:
                         if cnode is w:
-                            z.add_children(path)
                             break
                     else:
-                        z = Vertex(N, path)
                         u.link_to(w, z)
-                        for v in set(U.values()) - set(A):
-                            for q in table.get_reductions(v.state, ai):
-                                enqueue_paths_through(v, q, z)
+                        if U.get(w.state) is w:
+                            parents.setdefault(w, []).append(u)
+                        reexamine(u, w)
                 else:
-                    z = Vertex(N, path)
-                    u = Node(s, w, z)
+                    u = Node(s, w, z, level)
+                    if U.get(w.state) is w:
+                        parents.setdefault(w, []).append(u)
                     A.append(u)
                     U[s] = u
             else: break
-        if r is not None:
-            return [cvertex for cnode, cvertex in r.children]
-        if not Q:
-            raise InputNotRecognized('the input string is not recognized by the grammar')
+        return r, Q
+
+def recognize(table, input_string):
+    '''Decide whether an input string of Terminals is recognized with respect
+    to a parse table, using the GLR algorithm without building a parse
+    forest. Return a pair containing a boolean and, if the string is not
+    recognized, the index of the first token which cannot be read, which is
+    the length of the string if the string ends too early. Only the graph
+    structured stack is built, and a reduction is performed once for each
+    node it reaches rather than once for each path to it, so this is much
+    faster than glr_parse on ambiguous input.'''
+    table = table.compile()
+    max_length = max([0] + [table.rule_length(p)
+                            for p in xrange(len(table.productions))])
+    frontier = { 0 : _RecognizerNode(0) }
+    position = 0
+    for a in input_string:
+        ai = table.terminal_id(a)
+        if ai is None:
+            return False, position
+        accepted, shifts = _recognize_level(table, frontier, ai, max_length)
+        if not shifts:
+            return False, position
+        frontier = {}
+        for v, s in shifts:
+            u = frontier.get(s)
+            if u is None:
+                u = frontier[s] = _RecognizerNode(s)
+            u.targets.add(v)
+        position += 1
+    accepted, shifts = _recognize_level(table, frontier, table.end_marker_id,
+                                        max_length)
+    return (True, None) if accepted else (False, position)
+
+class _RecognizerNode(object):
+    # A node of the graph structured stack built by recognize, which records
+    # only the nodes it links to.
+
+    __slots__ = ('state', 'targets')
+
+    def __init__(self, state):
+        self.state = state
+        self.targets = set()
+
+def _recognize_level(table, U, ai, max_length):
+    # Perform all reductions in a level of the stack of recognize with
+    # lookahead ai. Return whether the input is accepted and a list of the
+    # shifts of ai as pairs of a node and a state.
+    get_reductions = table.get_reductions
+    get_goto = table.get_goto
+    get_shift = table.get_shift
+    left_side_id = table.left_side_id
+    rule_length = table.rule_length
+    NO_STATE = table.NO_STATE
+    A = deque(U.values())
+    R = deque()
+    shifts = []
+    accepted = False
+    # The reductions already performed, as pairs of the node reached and the
+    # nonterminal reduced. Doing one again would add nothing.
+    done = set()
+    processed = {}
+    parents = {}
+    while True:
+        if A:
+            v = A.popleft()
+            if table.has_accept(v.state, ai): accepted = True
+            s = get_shift(v.state, ai)
+            if s != NO_STATE: shifts.append((v, s))
+            reductions = get_reductions(v.state, ai)
+            for p in reductions:
+                R.append((v, p))
+            processed[v] = sorted(((rule_length(p), p) for p in reductions
+                                   if rule_length(p) > 0), reverse=True)
+        elif R:
+            v, p = R.popleft()
+            X = left_side_id(p)
+            targets = set([v])
+            for i in xrange(rule_length(p)):
+                targets = set([t for w in targets for t in w.targets])
+            for w in targets:
+                if (w, X) in done:
+                    continue
+                done.add((w, X))
+                s = get_goto(w.state, X)
+                u = U.get(s)
+                if u is None:
+                    u = U[s] = _RecognizerNode(s)
+                    u.targets.add(w)
+                    if U.get(w.state) is w:
+                        parents.setdefault(w, []).append(u)
+                    A.append(u)
+                    continue
+                if w in u.targets:
+                    continue
+                u.targets.add(w)
+                if U.get(w.state) is w:
+                    parents.setdefault(w, []).append(u)
+                # Redo the reductions of the processed nodes within reach of
+                # the new link, as glr_parse does. The nodes they reach which
+                # have already been reduced to are skipped.
+                distance = 0
+                frontier = [u]
+                seen = set(frontier)
+                while frontier and distance < max_length:
+                    next_frontier = []
+                    for x in frontier:
+                        for m, q in processed.get(x, ()):
+                            if m <= distance: break
+                            R.append((x, q))
+                        for y in parents.get(x, ()):
+                            if y not in seen:
+                                seen.add(y)
+                                next_frontier.append(y)
+                    distance += 1
+                    frontier = next_frontier
         else:
-            U.clear()
-            x = Vertex(ai)
-            while Q:
-                v, s = Q.popleft()
-                if s in U:
-                    u = U[s]
-                    u.link_to(v, x)
-                else:
-                    u = Node(s, v, x)
-                    U[s] = u
+            return accepted, shifts
+
+# The compiled parse tables used by parse, keyed by grammar fingerprint and
+# table kind. Its size limit may be changed, and its hit and miss counters
+# inspected, at any time.
+table_cache = LRUCache(maxsize=32)
+
+def get_table(grammar, table_kind='slr'):
+    '''Return a compiled parse table of some kind for a grammar, building it
+    only if it is not already in table_cache.'''
+    return table_cache.get_or_compute((grammar.fingerprint(), table_kind),
+        lambda: build_table(grammar, table_kind).compile())
+
+class Parser(object):
+    '''A GLR parser for a fixed grammar. The parse table is built once, when
+    the parser is created, and reused by every call to parse.'''
+
+    def __init__(self, grammar, table_kind='slr'):
+        '''Build the parser's table for a grammar. The kind of parse table is
+        given by table_kind, one of the keys of TABLE_BUILDERS.'''
+        self._grammar = grammar
+        self._table = build_table(grammar, table_kind).compile()
+
+    @property
+    def grammar(self):
+        '''Return the grammar recognized by the parser.'''
+        return self._grammar
+
+    @property
+    def table(self):
+        '''Return the parser's CompiledParseTable.'''
+        return self._table
+
+    def parse_forest(self, input_string):
+        '''Parse an input string of Terminals and return the roots of its
+        packed shared parse forest, as in glr_parse.'''
+        return glr_parse(self._table, input_string)
+
+    def parse(self, input_string):
+        '''Parse an input string of Terminals and enumerate all of its parse
+        trees, as in the module-level parse function.'''
+        for v in self.parse_forest(input_string):
+            for t in enumerate_trees(v):
+                yield t
 
-def parse(grammar, input_string):
+def parse(grammar, input_string, table_kind='slr'):
     '''Parse an input string of Terminals with respect to some context free
     grammar, enumerating all of its valid parse trees. If the language of the
     grammar does not recognize the input, an InputNotRecognized error is
     raised. At most one parse tree will be returned if the grammar is
     unambiguous. The parsing algorithm imposes no restrictions on the class of
-    CFG used; however, cyclic grammars may cause an infinite loop during the
-    parse tree enumeration process. A future implementation will instead encode
-    such cyclicities as cycles in the parse tree data structure.'''
-    for v in glr_parse(build_slr_table(grammar), input_string):
+    CFG used. Cyclic grammars produce cyclic forests, from which only the
+    trees in which no part of the forest is reused inside itself are
+    enumerated, as described in enumerate_trees. The kind of parse table used
+    is given by table_kind, one of the keys of TABLE_BUILDERS; LALR and LR(1)
+    tables cause fewer spurious stack splits. Tables are taken from
+    table_cache, so repeated calls with the same grammar do not rebuild
+    them.'''
+    for v in glr_parse(get_table(grammar, table_kind), input_string):
         for t in enumerate_trees(v):
             yield t
 
+
+def parse_many(grammar, inputs, workers=None, table_kind='slr', chunksize=16,
+               ordered=True):
+    '''Parse many input strings of Terminals with respect to the same grammar
+    in a pool of worker processes, workers in number, or one for each CPU by
+    default. The parse table is built once and handed to each worker once,
+    when it starts, and the inputs are sent to the workers as terminal
+    numbers in chunks of chunksize strings to reduce the cost of
+    communication. If ordered is true, generate the list of parse trees of
+    each input in the order of the inputs; otherwise, generate pairs of the
+    index of an input and its list of trees in the order in which they are
+    finished. The list of trees of an input which is not recognized is
+    empty.'''
+    table = get_table(grammar, table_kind)
+    ids = ([table.terminal_id(a) for a in s] for s in inputs)
+    pool = multiprocessing.Pool(workers, _init_worker, (table,))
+    try:
+        if ordered:
+            results = pool.imap(_parse_worker, ids, chunksize)
+        else:
+            results = pool.imap_unordered(_parse_indexed_worker,
+                                          enumerate(ids), chunksize)
+        for result in results:
+            yield result
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+# The parse table of a worker process started by parse_many.
+_worker_table = None
+
+def _init_worker(table):
+    global _worker_table
+    _worker_table = table
+
+def _parse_worker(input_ids):
+    if None in input_ids:
+        return []
+    try:
+        roots = glr_parse_ids(_worker_table, input_ids)
+    except InputNotRecognized:
+        return []
+    return [t for v in roots for t in enumerate_trees(v)]
+
+def _parse_indexed_worker(item):
+    i, input_ids = item
+    return i, _parse_worker(input_ids)
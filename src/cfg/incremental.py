@@ -0,0 +1,245 @@
+'''Incremental reparsing of a changing input with the GLR algorithm.
+
+An IncrementalParser holds an input string and the packed shared parse forest
+of it, and keeps a snapshot of the GLR parse after every token. When part of
+the input is replaced, the parse is resumed from the snapshot taken at the
+start of the change, so that the part of the input before the change is not
+parsed again.
+
+The part after the change is parsed again only until the parse falls back
+into step with the old one. After each token, the graph structured stack
+below the new snapshot is compared with the one below the old snapshot at the
+same place in the unchanged suffix. The stacks match if they have the same
+states linked in the same way, so that the old parse of the rest of the input
+would be repeated exactly, apart from the nodes and vertices covering the
+change and the positions after it. The rest of the old parse is then spliced
+in without reading its tokens again: the nodes of its stacks, and the
+vertices of its forest which cover part of the change, are copied on top of
+the new ones. So are the vertices after the change, with their positions
+shifted, unless the edit keeps the length of the input the same. Copying
+takes time linear in the number of nodes and vertices copied, but is much
+cheaper than parsing. The comparison itself only visits the parts of the
+stacks built since the start of the change, since everything below them is
+shared.'''
+
+from cfg.glr import GLRSession, InputNotRecognized, Node, Vertex, \
+    enumerate_trees
+
+class IncrementalParser(object):
+    '''A GLR parser for a string of Terminals which may be edited after it
+    has been parsed.'''
+
+    def __init__(self, table, input_string=()):
+        '''Parse an input string with respect to a parse table. An input
+        which is not recognized is allowed; the error is reported by forest.'''
+        self._session = GLRSession(table)
+        self._tokens = []
+        # The snapshot at index i is taken before token i is read.
+        self._snapshots = [self._session.snapshot()]
+        # There is no old parse to splice in until the input has been parsed.
+        self._roots = None
+        self._error_position = None
+        self.edit(0, 0, input_string)
+
+    @property
+    def tokens(self):
+        '''Return the current input string as a tuple of Terminals.'''
+        return tuple(self._tokens)
+
+    @property
+    def error_position(self):
+        '''Return the index of the first token which cannot be read, or the
+        length of the input if the input ends too early, or None if the
+        input is recognized.'''
+        return self._error_position
+
+    @property
+    def reused(self):
+        '''Return the number of tokens which the last edit did not parse
+        again, before and after the change.'''
+        return self._reused
+
+    def edit(self, start, end, new_tokens):
+        '''Replace the tokens of the input from index start up to but not
+        including index end with a sequence of new tokens, and parse the
+        result.'''
+        if not 0 <= start <= end <= len(self._tokens):
+            raise IndexError('edit range is out of bounds')
+        new_tokens = list(new_tokens)
+        old_snapshots = self._snapshots
+        old_roots = self._roots
+        old_error = self._error_position
+        parsed = old_roots is not None or old_error is not None
+        self._tokens[start:end] = new_tokens
+        shift = len(new_tokens) - (end - start)
+        resume = start + len(new_tokens)
+        # Snapshots after the last one which was taken are unavailable if the
+        # previous input was not recognized.
+        position = min(start, len(old_snapshots) - 1)
+        self._snapshots = old_snapshots[:position + 1]
+        self._roots = None
+        self._error_position = None
+        session = self._session
+        session.restore(self._snapshots[position])
+        spliced = 0
+        try:
+            level = position
+            while True:
+                # Try to splice in the old parse of the rest of the input once
+                # the new tokens have all been read.
+                if parsed and resume <= level < len(old_snapshots) + shift:
+                    splice = _Splice.match(self._snapshots[level],
+                                           old_snapshots[level - shift])
+                    if splice is not None:
+                        self._snapshots.extend(map(splice.snapshot,
+                            old_snapshots[level - shift + 1:]))
+                        if old_roots is not None:
+                            self._roots = map(splice.vertex, old_roots)
+                        else:
+                            self._error_position = old_error + shift
+                        spliced = len(self._tokens) - level
+                        break
+                if level == len(self._tokens):
+                    self._roots = session.finish()
+                    break
+                session.feed(self._tokens[level])
+                level += 1
+                self._snapshots.append(session.snapshot())
+        except InputNotRecognized:
+            self._error_position = len(self._snapshots) - 1
+        self._reused = position + spliced
+
+    def forest(self):
+        '''Return the roots of the packed shared parse forest of the current
+        input, as in glr_parse, or raise InputNotRecognized if the input is
+        not recognized.'''
+        if self._roots is None:
+            raise InputNotRecognized('the input string is not recognized by '
+                                     'the grammar at token %d' % self._error_position)
+        return self._roots
+
+    def trees(self):
+        '''Enumerate the parse trees of the current input.'''
+        for v in self.forest():
+            for t in enumerate_trees(v):
+                yield t
+
+class _Splice(object):
+    # A correspondence between the graph structured stack below an old
+    # snapshot and the one below a new snapshot taken at the same place in
+    # the unchanged rest of the input, which is used to rebuild the rest of
+    # the old parse on top of the new one.
+
+    def __init__(self, old_level, new_level):
+        self._old_level = old_level
+        self._shift = new_level - old_level
+        # The old nodes, vertices, and levels paired with new ones, and the
+        # reverse mappings, which must be one-to-one.
+        self._nodes = {}
+        self._vertices = {}
+        self._levels = { old_level : new_level }
+        self._new_nodes = {}
+        self._new_vertices = {}
+        self._new_levels = { new_level : old_level }
+
+    @staticmethod
+    def match(new, old):
+        # Pair the stacks below a new and an old snapshot, walking both in
+        # step until they reach nodes which they share. Return a _Splice, or
+        # None if the stacks differ.
+        new_level, new_frontier = new
+        old_level, old_frontier = old
+        new_frontier = dict(new_frontier)
+        old_frontier = dict(old_frontier)
+        if sorted(new_frontier) != sorted(old_frontier):
+            return None
+        result = _Splice(old_level, new_level)
+        stack = [(new_frontier[q], old_frontier[q]) for q in old_frontier]
+        while stack:
+            new_children, old_children = stack.pop()
+            if len(new_children) != len(old_children):
+                return None
+            for (u, x), (v, y) in zip(new_children, old_children):
+                if u.state != v.state or x.symbol != y.symbol:
+                    return None
+                unvisited = v not in result._nodes
+                if not (result._pair(v, u, result._nodes, result._new_nodes) and
+                        result._pair(y, x, result._vertices, result._new_vertices) and
+                        result._pair(v.level, u.level, result._levels,
+                                     result._new_levels)):
+                    return None
+                if unvisited and u is not v:
+                    stack.append((u.children, v.children))
+        return result
+
+    def _pair(self, old, new, mapping, reverse):
+        # Record that old corresponds to new, and tell whether this agrees
+        # with the pairs recorded before. Nodes and vertices are compared by
+        # identity, and levels by value.
+        return _same(mapping.setdefault(old, new), new) and \
+               _same(reverse.setdefault(new, old), old)
+
+    def position(self, i):
+        # Map a position in the old input to one in the new input.
+        if i >= self._old_level:
+            return i + self._shift
+        return self._levels.get(i, i)
+
+    def vertex(self, v):
+        # Return the vertex of the new parse corresponding to a vertex of the
+        # old one. A vertex is rebuilt if it was made after the old snapshot
+        # and either covers part of the change or has to be moved. Cycles are
+        # allowed, so the vertices are created before they are linked.
+        copies = self._vertices
+        moved = []
+        stack = [v]
+        while stack:
+            u = stack.pop()
+            if u in copies:
+                continue
+            if u.end < self._old_level or \
+                    (not self._shift and u.start >= self._old_level):
+                copies[u] = u
+                continue
+            copies[u] = Vertex(u.symbol, None, self.position(u.start),
+                               self.position(u.end))
+            moved.append(u)
+            for alt in u.children:
+                stack.extend(alt)
+        for u in moved:
+            z = copies[u]
+            for alt in u.children:
+                z.add_children([copies[c] for c in alt])
+        return copies[v]
+
+    def node(self, n):
+        # Return the node of the new parse corresponding to a node of the old
+        # one, rebuilding it if it was made after the old snapshot.
+        copies = self._nodes
+        moved = []
+        stack = [n]
+        while stack:
+            u = stack.pop()
+            if u in copies:
+                continue
+            if u.level < self._old_level:
+                copies[u] = u
+                continue
+            copies[u] = Node(u.state, None, None, self.position(u.level))
+            moved.append(u)
+            stack.extend(c for c, x in u.children)
+        for u in moved:
+            w = copies[u]
+            for c, x in u.children:
+                w.link_to(copies[c], self.vertex(x))
+        return copies[n]
+
+    def snapshot(self, snapshot):
+        # Move an old snapshot taken after the old one which was matched.
+        level, frontier = snapshot
+        return (level + self._shift,
+                [(state, [(self.node(c), self.vertex(x)) for c, x in children])
+                 for state, children in frontier])
+
+def _same(x, y):
+    return x is y or (isinstance(x, int) and x == y)
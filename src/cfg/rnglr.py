@@ -0,0 +1,269 @@
+'''The RNGLR parsing algorithm of Scott and Johnstone, and its binarised
+variant BRNGLR.
+
+RNGLR is a GLR algorithm which handles epsilon rules by reducing production
+rules as soon as the rest of their right sides is nullable, using the
+right-nulled reductions of an RNParseTable. This avoids the repeated path
+searches of Tomita's algorithm. Derivations of the empty string are shared in
+a single epsilon forest with one vertex per nullable nonterminal, whose
+vertices, unlike the others, have no span.
+
+BRNGLR additionally performs reductions of more than two symbols two symbols
+at a time, which makes the algorithm run in cubic time in the worst case.
+Partial derivations are recorded in intermediate vertices, which have spans
+like the vertices of nonterminals. The intermediate vertices are kept in the forest it returns, whose size is then at most cubic in the
+length of the input, and are spliced into the trees as they are built.
+
+Both algorithms produce packed shared parse forests made of Vertex objects,
+like those of the glr module, so that enumerate_trees and count_trees can be
+used on them.'''
+
+from collections import deque
+from cfg.glr import Vertex, InputNotRecognized, enumerate_trees, \
+    _intern_input, table_cache
+from cfg.table import ParseTable, RNParseTable, build_rn_table
+
+class _Node(object):
+    '''A node in the graph structured stack, labelled with a parser state and
+    the number of input symbols read when it was created.'''
+
+    __slots__ = ('state', 'level', 'edges', 'targets')
+
+    def __init__(self, state, level):
+        self.state = state
+        self.level = level
+        self.edges = []
+        self.targets = set()
+
+    def link_to(self, other, vertex):
+        self.edges.append((other, vertex))
+        self.targets.add(other)
+
+    def __repr__(self): return '_Node(%s, %s)' % (self.state, self.level)
+
+class _IntermediateVertex(Vertex):
+    '''A vertex created by BRNGLR which stands for a sequence of vertices at
+    the end of the right side of a production rule. Like other vertices, it
+    records the span of input covered by the sequence.'''
+
+    intermediate = True
+
+def rnglr_parse(table, input_string):
+    '''Parse an input string with respect to a parse table using the RNGLR
+    algorithm. The table may be a ParseTable, from which the RN table is
+    derived, or an RNParseTable. Return a list containing the root Vertex of
+    the packed shared parse forest of the input, or raise InputNotRecognized
+    if the string is not recognized.'''
+    table = _rn_table(table)
+    return _parse(table, list(_intern_input(table, input_string)), False)
+
+def brnglr_parse(table, input_string):
+    '''Parse an input string like rnglr_parse, but using the binarised BRNGLR
+    algorithm, which runs in at most cubic time. The forest may contain
+    intermediate vertices, which stand for sequences of vertices.'''
+    table = _rn_table(table)
+    return _parse(table, list(_intern_input(table, input_string)), True)
+
+def rnglr_parse_ids(table, input_ids, binarised=False):
+    '''Parse a sequence of terminal numbers with respect to an RNParseTable
+    using the RNGLR algorithm, or the BRNGLR algorithm if binarised is true.
+    The input must not include the end marker.'''
+    return _parse(table, list(input_ids), binarised)
+
+def _rn_table(table):
+    if isinstance(table, RNParseTable):
+        return table
+    if isinstance(table, ParseTable):
+        return RNParseTable(table)
+    raise TypeError('an RNParseTable or ParseTable is required')
+
+def epsilon_forest(table):
+    '''Return a dict mapping the number of each nullable nonterminal of an
+    RNParseTable to a Vertex encoding all of its derivations of the empty
+    string. A rule which occurs more than once in the grammar gives a single
+    alternative.'''
+    nonterminals = table.nonterminals
+    result = {}
+    for A in xrange(len(nonterminals)):
+        if table.is_nullable(A):
+            result[A] = Vertex(nonterminals[A])
+    alternatives = set()
+    for p, rule in enumerate(table.productions):
+        A = table.left_side_id(p)
+        if A in result and all(X.is_nonterminal() and
+                               table.is_nullable(table.nonterminal_id(X))
+                               for X in rule.right_side):
+            children = [table.nonterminal_id(X) for X in rule.right_side]
+            key = (A,) + tuple(children)
+            if key not in alternatives:
+                alternatives.add(key)
+                result[A].add_children([result[B] for B in children])
+    return result
+
+def _parse(table, input_ids, binarised):
+    productions = table.productions
+    terminals = table.terminals
+    get_rn_reductions = table.get_rn_reductions
+    get_goto = table.get_goto
+    get_shift = table.get_shift
+    left_side_id = table.left_side_id
+    nonterminals = table.nonterminals
+    NO_STATE = table.NO_STATE
+
+    epsilon = epsilon_forest(table)
+    # The epsilon vertices which complete each right-nulled reduction.
+    nulled_parts = {}
+    def nulled_part(p, m):
+        key = (p, m)
+        if key not in nulled_parts:
+            nulled_parts[key] = [epsilon[table.nonterminal_id(X)]
+                                 for X in productions[p].right_side[m:]]
+        return nulled_parts[key]
+
+    def add_children(z, children):
+        # Add an alternative to a vertex unless it already has it.
+        key = tuple(map(id, children))
+        alternatives = packed.setdefault(id(z), set())
+        if key not in alternatives:
+            alternatives.add(key)
+            z.add_children(children)
+
+    def paths(v, length):
+        # Enumerate the paths of a certain length from a node as pairs of the
+        # node reached and the list of vertices along the path, in order.
+        stack = [(v, length, None)]
+        while stack:
+            u, length, path = stack.pop()
+            if length > 0:
+                for w, x in reversed(u.edges):
+                    stack.append((w, length - 1, (x, path)))
+            else:
+                result = []
+                while path is not None:
+                    x, path = path
+                    result.append(x)
+                yield u, result
+
+    def queue_reductions(w, u, z, state):
+        # Queue the reductions which follow the new link from w to u with
+        # vertex z, and those of length 0 of node w if it is new.
+        for p, m in get_rn_reductions(state, a):
+            if m != 0:
+                if z is not None:
+                    R.append((u, p, m, m, z))
+            elif w is not None:
+                R.append((w, p, 0, 0, None))
+
+    def reducer(v, p, d, m, y):
+        # Perform the reduction of the first d symbols of production p for
+        # paths of length m starting with the link with vertex y which ends
+        # at node v.
+        X = left_side_id(p)
+        if m == 0:
+            targets = [(v, None)]
+        elif binarised and m > 2:
+            # Reduce two symbols at a time, sharing intermediate vertices with
+            # the same production, position, and extent.
+            for u, x in v.edges:
+                key = (p, d, m - 1, u.level)
+                z = intermediates.get(key)
+                if z is None:
+                    z = intermediates[key] = _IntermediateVertex(
+                        nonterminals[X], None, u.level, i)
+                add_children(z, [x, y])
+                if (p, d, m - 1, u) not in continued:
+                    continued.add((p, d, m - 1, u))
+                    R.append((u, p, d, m - 1, z))
+            return
+        else:
+            targets = paths(v, m - 1)
+        for u, path in targets:
+            l = get_goto(u.state, X)
+            if m == 0:
+                z = epsilon[X]
+            else:
+                key = (X, u.level)
+                z = N.get(key)
+                if z is None:
+                    z = N[key] = Vertex(nonterminals[X], None, u.level, i)
+                path.append(y)
+                if d < len(productions[p].right_side):
+                    path.extend(nulled_part(p, d))
+                add_children(z, path)
+            w = U.get(l)
+            if w is not None:
+                if u not in w.targets:
+                    w.link_to(u, z)
+                    if m != 0:
+                        queue_reductions(None, u, z, l)
+            else:
+                w = U[l] = _Node(l, i)
+                w.link_to(u, z)
+                s = get_shift(l, a)
+                if s != NO_STATE: Q.append((w, s))
+                queue_reductions(w, u, z if m != 0 else None, l)
+
+    input_ids.append(table.end_marker_id)
+    n = len(input_ids) - 1
+    v0 = _Node(0, 0)
+    U = { 0 : v0 }
+    R = deque()
+    Q = deque()
+    a = input_ids[0]
+    s = get_shift(0, a)
+    if s != NO_STATE: Q.append((v0, s))
+    queue_reductions(v0, None, None, 0)
+    for i in xrange(n + 1):
+        a = input_ids[i]
+        N = {}
+        packed = {}
+        intermediates = {}
+        continued = set()
+        while R:
+            reducer(*R.popleft())
+        if i == n: break
+        # Shift the next input symbol.
+        a = input_ids[i + 1]
+        x = Vertex(terminals[input_ids[i]], None, i, i + 1)
+        U = {}
+        Qnext = deque()
+        while Q:
+            v, k = Q.popleft()
+            w = U.get(k)
+            if w is not None:
+                w.link_to(v, x)
+                queue_reductions(None, v, x, k)
+            else:
+                w = U[k] = _Node(k, i + 1)
+                w.link_to(v, x)
+                s = get_shift(k, a)
+                if s != NO_STATE: Qnext.append((w, s))
+                queue_reductions(w, v, x, k)
+        Q = Qnext
+        if not U:
+            raise InputNotRecognized('the input string is not recognized by the grammar')
+    w = U.get(ParseTable.ACCEPT_STATE)
+    if w is not None:
+        for u, z in w.edges:
+            if u is v0:
+                return [z]
+    raise InputNotRecognized('the input string is not recognized by the grammar')
+
+def get_rn_table(grammar, table_kind='slr'):
+    '''Return an RNParseTable derived from a parse table of some kind for a
+    grammar, building it only if it is not already in the glr module's
+    table_cache.'''
+    return table_cache.get_or_compute(
+        (grammar.fingerprint(), table_kind, 'rn'),
+        lambda: build_rn_table(grammar, table_kind))
+
+def parse(grammar, input_string, table_kind='slr', binarised=False):
+    '''Parse an input string of Terminals with respect to some context free
+    grammar using the RNGLR algorithm, or BRNGLR if binarised is true, and
+    enumerate all of its parse trees. If the input is not recognized, an
+    InputNotRecognized error is raised.'''
+    table = get_rn_table(grammar, table_kind)
+    for v in rnglr_parse_ids(table, _intern_input(table, input_string),
+                             binarised):
+        for t in enumerate_trees(v):
+            yield t
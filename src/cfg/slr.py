@@ -2,7 +2,6 @@
 
 from collections import deque
 import pprint
-import copy
 import cgi
 
 import util.html
@@ -10,7 +9,8 @@ import util.html
 from core import ContextFreeGrammar, Terminal, Nonterminal, Marker, Epsilon, \
                  ProductionRule, PrimedNonterminal
 import automaton
-from table import ParseTableNormalForm
+from table import ParseTableNormalForm, first_sets, follow_sets, \
+                  suffix_first_sets
 
 END_MARKER = Marker('$')
 
@@ -88,15 +88,18 @@ def closure(item, grammar):
     assert isinstance(item, Item)
     assert isinstance(grammar, ContextFreeGrammar)
     result = [item]
+    members = set(result)
     seen = set()
     i = 0
     while i < len(result):
         source_item = result[i]
         A = source_item.after_dot()
         if isinstance(A, Nonterminal) and A not in seen:
-            result.extend(
-                filter(lambda x: x not in result,
-                       map(lambda x: Item(x, 0), grammar.productions_with_left_side(A))))
+            for p in grammar.productions_with_left_side(A):
+                new_item = Item(p, 0)
+                if new_item not in members:
+                    result.append(new_item)
+                    members.add(new_item)
             seen.add(A)
         i += 1
     return result
@@ -107,7 +110,8 @@ def is_kernel_item(item, grammar):
            (item.dot_pos > 0 or item.production.left_side == grammar.start)
 
 class Closure(object):
-    '''A closure of a set of items.'''
+    '''A closure of a set of items. The items of the closure and its
+    transitions are computed once, when they are first needed.'''
 
     def __init__(self, kernel_items, grammar):
         '''Construct with a set of kernel items and the grammar to which they
@@ -116,18 +120,23 @@ class Closure(object):
             assert is_kernel_item(ki, grammar)
         self.kernel_items = kernel_items
         self.grammar = grammar
+        self._items = None
+        self._goto_symbols = None
+        self._goto_kernels = None
 
     def closure_nonterminals(self):
         '''Return the nonterminals on which the closure has transitions to non-
         empty closures.'''
 
         result = []
+        seen = set()
 
         # Get the nonterminals to the right of a dot in the kernel items.
         for item in self.kernel_items:
             X = item.after_dot()
-            if isinstance(X, Nonterminal) and X not in result:
+            if isinstance(X, Nonterminal) and X not in seen:
                 result.append(X)
+                seen.add(X)
 
         # For every nonterminal found, include any nonterminals which appear
         # at the beginning of rules with those nonterminals on the left side.
@@ -136,8 +145,9 @@ class Closure(object):
             for p in self.grammar.productions_with_left_side(result[i]):
                 if len(p.right_side) > 0:
                     X = p.right_side[0]
-                    if isinstance(X, Nonterminal) and X not in result:
+                    if isinstance(X, Nonterminal) and X not in seen:
                         result.append(X)
+                        seen.add(X)
             i += 1
 
         return result
@@ -148,12 +158,32 @@ class Closure(object):
 
     def items(self):
         '''Enumerate all of the items, kernel and non-kernel.'''
-        return self.kernel_items + self.closure_items()
+        if self._items is None:
+            self._items = self.kernel_items + self.closure_items()
+        return self._items
+
+    def _partition_items(self):
+        # Group the advanced items by the symbol after the dot in a single
+        # pass, keeping the symbols in order of first appearance.
+        symbols = []
+        kernels = {}
+        for item in self.items():
+            X = item.after_dot()
+            if X is not None:
+                if X in kernels:
+                    kernels[X].append(item.dot_advanced())
+                else:
+                    symbols.append(X)
+                    kernels[X] = [item.dot_advanced()]
+        self._goto_symbols = symbols
+        self._goto_kernels = kernels
 
     def goto_kernel_items(self, X):
         '''Enumerate the kernel items to which the closure transitions on a
         certain symbol.'''
-        return [item.dot_advanced() for item in self.items() if item.after_dot() == X]
+        if self._goto_kernels is None:
+            self._partition_items()
+        return list(self._goto_kernels.get(X, []))
 
     def goto(self, X):
         '''Return the closure to which this closure transitions on a certain
@@ -163,12 +193,9 @@ class Closure(object):
     def goto_symbols(self):
         '''Enumerate the symbols on which this closure has transitions to non-
         empty closures.'''
-        seen = []
-        for item in self.items():
-            X = item.after_dot()
-            if X is not None and X not in seen:
-                seen.append(X)
-        return seen
+        if self._goto_symbols is None:
+            self._partition_items()
+        return list(self._goto_symbols)
 
     def transitions(self):
         '''Enumerate all of the transitions leading out of this closure to non-
@@ -176,6 +203,11 @@ class Closure(object):
         symbol and Ii is the closure to which the transition leads.'''
         return [(X, self.goto(X)) for X in self.goto_symbols()]
 
+    def kernel(self):
+        '''Return the kernel items as a frozenset, which identifies the
+        closure.'''
+        return frozenset(self.kernel_items)
+
     def __nonzero__(self):
         '''The closure evaluates to True if and only if it is non-empty.'''
         return bool(self.kernel_items)
@@ -211,24 +243,28 @@ class Automaton(automaton.Automaton):
 
         # Add initial state
         self._states = [initial_closure]
+        self._state_indexes = { initial_closure.kernel() : 0 }
         self.add_state(0)
 
-        # Add other states in DFS order
+        # Add other states in BFS order. Each state is identified by its set
+        # of kernel items, and its closure is only built the first time that
+        # kernel is reached.
         i = 0
         while i < len(self._states):
-            for X, I in self._states[i].transitions():
-                index = self._get_state_index(I)
+            I = self._states[i]
+            for X in I.goto_symbols():
+                kernel_items = I.goto_kernel_items(X)
+                key = frozenset(kernel_items)
+                index = self._state_indexes.get(key)
                 if index is None:
                     index = len(self._states)
-                    self._states.append(I)
+                    self._states.append(Closure(kernel_items, Gp))
+                    self._state_indexes[key] = index
                 self.add_transition(i, X, index)
             i += 1
 
     def _get_state_index(self, closure):
-        try:
-            return self._states.index(closure)
-        except ValueError:
-            return None
+        return self._state_indexes.get(closure.kernel())
 
     def augmented_grammar(self):
         return self._grammar
@@ -261,7 +297,9 @@ class Automaton(automaton.Automaton):
 
 class FirstSetTable(object):
     '''The first set table used for the SLR automaton construction algorithm.
-    '''
+    The sets are computed by table.first_sets; its results are kept in the
+    attributes first, a BitsetMap of the first sets, and
+    nullable_nonterminals, the set of nullable nonterminals.'''
 
     def __init__(self, grammar):
         self.grammar = grammar
@@ -273,6 +311,13 @@ class FirstSetTable(object):
     def nullable(self, A):
         return self.table[A][1]
 
+    def suffix_first(self, production, dot_pos):
+        '''Return the first set of the symbols after a position in the right
+        side of a production rule, and whether they are nullable. These are
+        computed for every rule of the grammar ahead of time by
+        table.suffix_first_sets.'''
+        return self._suffixes[production, dot_pos]
+
     def string_first(self, s):
         result = set()
         for X in s:
@@ -287,31 +332,13 @@ class FirstSetTable(object):
         return result, True
 
     def _compute(self):
-        self.table = {A : [set(), False] for A in self.grammar.nonterminals}
-        pass_number = 1
-        changed = True
-        rules = list(self.grammar.productions)
-        while changed:
-            old_table = copy.deepcopy(self.table)
-            changed = False
-            next_rules = []
-            for p in rules:
-                A = p.left_side
-                for i, Xi in enumerate(p.right_side):
-                    if Xi in self.grammar.nonterminals:
-                        self.table[A][0] |= self.table[Xi][0]
-                        if not self.table[Xi][1]:
-                            next_rules.append(ProductionRule(A, p.right_side[i:]))
-                            break
-                    else:
-                        self.table[A][0].add(Xi)
-                        break
-                else:
-                    self.table[A][1] = True
-            if old_table != self.table:
-                changed = True
-            rules = next_rules
-            pass_number += 1
+        # The first sets are computed by table.first_sets, which keeps them
+        # as bitsets, and are also decoded into the sets of the table.
+        self.first, self.nullable_nonterminals = first_sets(self.grammar)
+        self._suffixes = suffix_first_sets(self.grammar, self.first,
+                                           self.nullable_nonterminals)
+        self.table = { A : [set(self.first[A]), A in self.nullable_nonterminals]
+                       for A in self.grammar.nonterminals }
 
     def html(self):
         return '''\
@@ -324,7 +351,7 @@ class FirstSetTable(object):
 
 class FollowSetTable(object):
     '''The follow set table used for the SLR automaton construction and table
-    construction algorithms.'''
+    construction algorithms, computed by table.follow_sets.'''
 
     def __init__(self, first_sets, automaton):
         self.first_sets = first_sets
@@ -336,22 +363,11 @@ class FollowSetTable(object):
         return self.table[A]
 
     def _compute(self):
-        self.table = {A : set() for A in self.grammar.nonterminals}
-        self.table[self.grammar.start].add(END_MARKER)
-        changed = True
-        while changed:
-            changed = False
-            old_table = copy.deepcopy(self.table)
-            for p in self.grammar.productions:
-                A = p.left_side
-                for i, B in enumerate(p.right_side):
-                    if isinstance(B, Nonterminal):
-                        Bfirst, Bempty = self.first_sets.string_first(p.right_side[i+1:])
-                        self.table[B] |= Bfirst
-                        if Bempty:
-                            self.table[B] |= self.table[A]
-            if old_table != self.table:
-                changed = True
+        # The follow sets are computed by table.follow_sets from the bitsets
+        # of the first set table.
+        follow = follow_sets(self.grammar, self.first_sets.first,
+                             self.first_sets.nullable_nonterminals)
+        self.table = { A : set(follow[A]) for A in self.grammar.nonterminals }
 
     def html(self):
         return '''\
@@ -417,7 +433,7 @@ class ParsingTable(object):
                     else:
                         # Add reduce actions
                         for a in self.follow(A):
-                            self._add_action(i, a, (ParsingTable.REDUCE, M.augmented_grammar().productions.index(item.production)))
+                            self._add_action(i, a, (ParsingTable.REDUCE, M.augmented_grammar().production_index(item.production)))
 
     def _init_table(self, action, goto):
         assert len(action) == len(goto)
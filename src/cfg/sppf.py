@@ -0,0 +1,253 @@
+'''A compact representation of shared packed parse forests.
+
+The forests built by the GLR algorithms consist of Vertex objects which hold
+their alternatives as lists of lists. A CompactForest stores the same
+information in a few flat integer arrays. Each node is identified by a
+symbol and the span of input it covers, and nodes with the same symbol and
+span are merged, so every token of the input is represented by one leaf. The
+alternatives of the nodes, and the children of the alternatives, are stored
+as contiguous runs of integers.
+
+ForestNode objects present the nodes of a CompactForest with the same
+symbol and children attributes as Vertex objects, so enumerate_trees,
+count_trees, and the functions of the viterbi module work on them as well.'''
+
+from array import array
+from util.mixin import Comparable, Keyed
+from util.digraph import strongly_connected_components
+from cfg.glr import enumerate_trees, forest_successors, is_cycle
+
+class CompactForest(object):
+    '''A shared packed parse forest stored in flat integer arrays. Nodes are
+    numbered so that they can be looked up by (symbol, start, end), where
+    start and end are input positions. The dicts used to merge nodes are
+    discarded once the forest is built, so apart from the numbering of its
+    symbols, it holds only arrays.'''
+
+    def __init__(self, roots):
+        '''Convert a forest of Vertex objects, given as a list of roots such
+        as the one returned by glr_parse, into compact form.'''
+        lengths = _vertex_lengths(roots)
+        self._symbol_list = []
+        self._symbol_ids = {}
+        node_ids = {}
+        symbols = array('i')
+        starts = array('i')
+        ends = array('i')
+        intermediate = array('b')
+        alternatives = []
+        # Intermediate vertices stand for different sequences even when they
+        # have the same symbol and span, so they are not merged.
+        intermediate_ids = {}
+        def node_id(v, start):
+            symbol = self._symbol_ids.get(v.symbol)
+            if symbol is None:
+                symbol = self._symbol_ids[v.symbol] = len(self._symbol_list)
+                self._symbol_list.append(v.symbol)
+            if v.intermediate:
+                ids, key = intermediate_ids, id(v)
+            else:
+                ids, key = node_ids, (symbol, start, start + lengths[v])
+            i = ids.get(key)
+            if i is None:
+                i = ids[key] = len(symbols)
+                symbols.append(symbol)
+                starts.append(start)
+                ends.append(start + lengths[v])
+                intermediate.append(v.intermediate)
+                alternatives.append([])
+            if (id(v), start) not in visited:
+                visited.add((id(v), start))
+                stack.append((v, start, i))
+            return i
+        visited = set()
+        stack = []
+        self._roots = [node_id(v, 0) for v in roots]
+        seen_alternatives = set()
+        while stack:
+            v, start, i = stack.pop()
+            for alt in v.children:
+                children = []
+                position = start
+                for c in alt:
+                    children.append(node_id(c, position))
+                    position += lengths[c]
+                key = (i,) + tuple(children)
+                if key not in seen_alternatives:
+                    seen_alternatives.add(key)
+                    alternatives[i].append(children)
+        self._symbols = symbols
+        self._starts = starts
+        self._ends = ends
+        self._intermediate = intermediate
+        self._alternative_offsets = array('i', [0])
+        self._child_offsets = array('i', [0])
+        self._children = array('i')
+        for alts in alternatives:
+            for children in alts:
+                self._children.extend(children)
+                self._child_offsets.append(len(self._children))
+            self._alternative_offsets.append(len(self._child_offsets) - 1)
+        # The node numbers grouped by the positions at which their spans
+        # start, for find.
+        self._start_offsets = array('i', [0] * (max(ends or [0]) + 2))
+        for start in starts:
+            self._start_offsets[start + 1] += 1
+        for i in xrange(1, len(self._start_offsets)):
+            self._start_offsets[i] += self._start_offsets[i - 1]
+        self._by_start = array('i', [0] * len(starts))
+        filled = self._start_offsets[:-1]
+        for i, start in enumerate(starts):
+            self._by_start[filled[start]] = i
+            filled[start] += 1
+
+    @property
+    def roots(self):
+        '''Return the roots of the forest as a list of ForestNode objects.'''
+        return [self.node(i) for i in self._roots]
+
+    @property
+    def symbols(self):
+        '''Return the list of symbols, indexed by symbol number.'''
+        return self._symbol_list
+
+    def num_nodes(self):
+        '''Return the number of nodes in the forest.'''
+        return len(self._symbols)
+
+    def num_alternatives(self):
+        '''Return the total number of alternatives of all nodes.'''
+        return len(self._child_offsets) - 1
+
+    def node(self, i):
+        '''Return a ForestNode for node number i. ForestNode objects for the
+        same node are equal.'''
+        return ForestNode(self, i)
+
+    def find(self, symbol, start, end):
+        '''Return the ForestNode for a symbol spanning input positions start
+        to end, or None if there is none. The nodes whose spans start at the
+        same position are searched.'''
+        s = self._symbol_ids.get(symbol)
+        if s is None or not 0 <= start < len(self._start_offsets) - 1:
+            return None
+        for j in xrange(self._start_offsets[start], self._start_offsets[start + 1]):
+            i = self._by_start[j]
+            if self._symbols[i] == s and self._ends[i] == end and \
+                    not self._intermediate[i]:
+                return self.node(i)
+        return None
+
+    def node_symbol(self, i):
+        '''Return the symbol of node number i.'''
+        return self._symbol_list[self._symbols[i]]
+
+    def node_span(self, i):
+        '''Return the start and end positions of node number i.'''
+        return self._starts[i], self._ends[i]
+
+    def node_alternatives(self, i):
+        '''Return the alternatives of node number i as lists of node
+        numbers.'''
+        result = []
+        for j in xrange(self._alternative_offsets[i], self._alternative_offsets[i + 1]):
+            result.append(self._children[self._child_offsets[j]:self._child_offsets[j + 1]].tolist())
+        return result
+
+    def trees(self, limit=None):
+        '''Enumerate the parse trees encoded in the forest, as ParseTree
+        objects, stopping after limit trees if a limit is given.'''
+        count = 0
+        for v in self.roots:
+            for t in enumerate_trees(v, None if limit is None else limit - count):
+                yield t
+                count += 1
+            if count == limit:
+                return
+
+class ForestNode(Comparable, Keyed):
+    '''A view of a node of a CompactForest which can be used in place of a
+    Vertex. Views of the same node are equal.'''
+
+    __slots__ = ('_forest', '_index')
+
+    def __init__(self, forest, index):
+        self._forest = forest
+        self._index = index
+
+    @property
+    def index(self):
+        '''Return the node's number in its forest.'''
+        return self._index
+
+    @property
+    def symbol(self):
+        '''Return the symbol of the node.'''
+        return self._forest.node_symbol(self._index)
+
+    @property
+    def start(self):
+        '''Return the input position at which the node's span starts.'''
+        return self._forest._starts[self._index]
+
+    @property
+    def end(self):
+        '''Return the input position at which the node's span ends.'''
+        return self._forest._ends[self._index]
+
+    @property
+    def intermediate(self):
+        '''Tell whether the node stands for a sequence of nodes, as the
+        intermediate vertices of BRNGLR do.'''
+        return bool(self._forest._intermediate[self._index])
+
+    @property
+    def children(self):
+        '''Return the alternatives of the node as lists of ForestNode
+        objects.'''
+        node = self._forest.node
+        return [map(node, alt)
+                for alt in self._forest.node_alternatives(self._index)]
+
+    def __key__(self):
+        return (id(self._forest), self._index)
+
+    def __repr__(self):
+        return 'ForestNode(%s, %d, %d)' % (self.symbol, self.start, self.end)
+
+def _vertex_lengths(roots):
+    # Find the number of tokens spanned by every vertex reachable from the
+    # roots. All alternatives of a vertex span the same number of tokens.
+    lengths = {}
+    def length(alt):
+        total = 0
+        for c in alt:
+            if c not in lengths:
+                return None
+            total += lengths[c]
+        return total
+    for component in strongly_connected_components(roots, forest_successors):
+        if not is_cycle(component):
+            u, = component
+            if u.children:
+                lengths[u] = length(u.children[0])
+            else:
+                lengths[u] = 1
+            continue
+        # The vertices on a cycle get their lengths from alternatives which
+        # lead out of the cycle.
+        pending = list(component)
+        while pending:
+            remaining = []
+            for u in pending:
+                for alt in u.children:
+                    n = length(alt)
+                    if n is not None:
+                        lengths[u] = n
+                        break
+                else:
+                    remaining.append(u)
+            if len(remaining) == len(pending):
+                raise ValueError('the forest has a cycle which derives no tree')
+            pending = remaining
+    return lengths
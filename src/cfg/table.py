@@ -1,84 +1,156 @@
 '''Functions for building SLR parser tables.'''
 
+import os
 import sys
+import errno
+import struct
+import tempfile
+import cPickle as pickle
+from array import array
+from cStringIO import StringIO
 from collections import deque
 from core import ContextFreeGrammar as CFG, Marker
+from util.bitset import BitsetIndex, BitsetMap
+from util.digraph import union_closure
 
 END_MARKER = Marker('$')
 
 def first_sets(G):
     '''Compute the first sets for the variables in a grammar. Return a pair
-    whose first element is a dictionary mapping variables to their first sets
-    (as sets of Nonterminals) and whose second element is the set of nullable
-    variables in the grammar.'''
-    result = { A : set() for A in G.nonterminals }
-    nullable = set()
-    R = deque((p, 0) for p in G.productions)
-    Rnext = deque()
-    Q = []
-    while True:
-        m = False
-        while R:
-            p, i = R.popleft()
-            A = p.left_side
-            while True:
-                if i < len(p.right_side):
-                    X = p.right_side[i]
-                    if X.is_terminal():
-                        m = (X not in result[A]) or m
-                        result[A].add(X)
-                    else:
-                        Q.append((X, A)) # X merges into A
-                        if X in nullable:
-                            i += 1
-                            continue
-                        else:
-                            Rnext.append((p, i))
-                else:
-                    m = (A not in nullable) or m
-                    nullable.add(A)
+    whose first element maps variables to their first sets and whose second
+    element is the set of nullable variables in the grammar. The first sets
+    are stored as integer bitsets in a BitsetMap, which gives them as
+    frozensets of Terminals.'''
+    nonterminals = G.nonterminals
+    nullable = _nullable_nonterminals(G.productions, nonterminals)
+    index = _terminal_index(G)
+    # FIRST(A) contains FIRST(B) whenever A -> alpha B beta and alpha is
+    # nullable, so the first sets are the unions of the terminals which begin
+    # the rules over this relation.
+    result = dict.fromkeys(nonterminals, 0)
+    successors = { A : [] for A in nonterminals }
+    for p in G.productions:
+        for X in p.right_side:
+            if X.is_terminal():
+                result[p.left_side] |= index.bit(X)
                 break
-        if not m: break
-        R, Rnext = Rnext, R
-    while True:
-        m = False
-        for A, B in Q: # A merges into B
-            m = bool(result[A] - result[B]) or m
-            result[B].update(result[A])
-        if not m: break
-    return result, nullable
+            successors[p.left_side].append(X)
+            if X not in nullable:
+                break
+    union_closure(nonterminals, successors.__getitem__, result)
+    return BitsetMap(index, result), nullable
 
 def follow_sets(G, first, nullable):
     '''Compute the follow sets for the variables in a grammar. The first sets
-    and nullable variables must be given. Returns a dictionary mapping
-    variables to their follow sets (as sets of Nonterminals).'''
-    result = { A : set() for A in G.nonterminals }
-    result[G.start].add(END_MARKER)
-    Q = []
+    and nullable variables must be given. Return a BitsetMap mapping variables
+    to their follow sets, which shares the bit assignment of the first sets if
+    they are a BitsetMap.'''
+    if isinstance(first, BitsetMap):
+        index = first.index
+        first_bits = first.bits
+    else:
+        index = _terminal_index(G)
+        first_bits = lambda A: index.encode(first[A])
+    result = dict.fromkeys(G.nonterminals, 0)
+    result[G.start] = index.bit(END_MARKER)
+    # FOLLOW(B) contains FIRST(beta), and FOLLOW(A) if beta is nullable,
+    # whenever A -> alpha B beta.
+    suffixes = _suffix_first_bits(G.productions, first_bits, nullable,
+                                  index.bit)
+    successors = { A : [] for A in G.nonterminals }
     for p in G.productions:
-        A = p.left_side
+        for i, X in enumerate(p.right_side):
+            if not X.is_terminal():
+                F, n = suffixes[p, i + 1]
+                result[X] |= F
+                if n:
+                    successors[X].append(p.left_side)
+    union_closure(G.nonterminals, successors.__getitem__, result)
+    return BitsetMap(index, result)
+
+def suffix_first_sets(G, first, nullable):
+    '''Compute the first set and nullability of every suffix of the right
+    side of every production rule in a grammar. The first sets and nullable
+    variables must be given. Return a dict mapping each pair (p, i) of a
+    production rule and a position from 0 to the length of its right side to
+    a pair containing the first set of p.right_side[i:] as a frozenset and
+    whether that suffix is nullable. Each rule is scanned once from right to
+    left, so this takes time linear in the size of the grammar.'''
+    if isinstance(first, BitsetMap):
+        index = first.index
+        first_bits = first.bits
+    else:
+        index = _terminal_index(G)
+        first_bits = lambda A: index.encode(first[A])
+    suffixes = _suffix_first_bits(G.productions, first_bits, nullable,
+                                  index.bit)
+    # Many suffixes share the same first set, so each distinct bitset is
+    # decoded only once.
+    decoded = {}
+    result = {}
+    for key, (F, n) in suffixes.iteritems():
+        if F not in decoded:
+            decoded[F] = frozenset(index.decode(F))
+        result[key] = (decoded[F], n)
+    return result
+
+def _suffix_first_bits(productions, first_bits, nullable, terminal_bit):
+    # Map each pair (p, i) to the first set of p.right_side[i:] as a bitset
+    # and whether it is nullable. The first set of a suffix is that of its
+    # first symbol, together with the first set of the rest of the suffix if
+    # the symbol is nullable.
+    result = {}
+    for p in productions:
+        rs = p.right_side
+        F = 0
         n = True
-        F = set()
-        for X in reversed(p.right_side):
+        result[p, len(rs)] = (F, n)
+        for i in xrange(len(rs) - 1, -1, -1):
+            X = rs[i]
             if X.is_terminal():
+                F = terminal_bit(X)
                 n = False
-                F.clear(); F.add(X)
+            elif X in nullable:
+                F |= first_bits(X)
             else:
-                result[X].update(F)
-                if n:
-                    Q.append((A, X)) # A merges into X
-                if X not in nullable:
-                    F.clear()
-                    n = False
-                F.update(first[X])
-    m = True
-    while m:
-        m = False
-        for A, B in Q: # A merges into B
-            m = m or bool(result[A] - result[B])
-            result[B].update(result[A])
+                F = first_bits(X)
+                n = False
+            result[p, i] = (F, n)
     return result
 
+def _terminal_index(G):
+    # Assign bits to the terminals of a grammar and the end marker.
+    terminals = sorted(G.terminals)
+    if END_MARKER not in terminals:
+        terminals.append(END_MARKER)
+    return BitsetIndex(terminals)
+
+def _nullable_nonterminals(productions, nonterminals):
+    # Find the nullable nonterminals by counting the symbols of each rule which
+    # are not yet known to be nullable, in time linear in the size of the
+    # grammar.
+    nullable = set()
+    remaining = []
+    occurrences = { A : [] for A in nonterminals }
+    queue = []
+    for i, p in enumerate(productions):
+        remaining.append(len(p.right_side))
+        if all(X in occurrences for X in p.right_side):
+            for X in p.right_side:
+                occurrences[X].append(i)
+            if not p.right_side:
+                queue.append(p.left_side)
+    while queue:
+        A = queue.pop()
+        if A in nullable:
+            continue
+        nullable.add(A)
+        for i in occurrences[A]:
+            remaining[i] -= 1
+            if remaining[i] == 0:
+                queue.append(productions[i].left_side)
+    return nullable
+
 class ParseTable(object):
     '''An SLR parse table class which allows for multi-valued entries (shift-
     reduce and reduce-reduce conflicts).'''
@@ -88,6 +160,7 @@ class ParseTable(object):
         self._REDUCE = {}
         self._GOTOSHIFT = {}
         self._grammar = grammar
+        self._compiled = None
 
     def add_reduction(self, state, symbol, r):
         '''Add a reduction entry to the cell indexed by state and symbol. r
@@ -97,6 +170,7 @@ class ParseTable(object):
         if symbol in row: cell = row[symbol]
         else: cell = row[symbol] = []
         cell.append(r)
+        self._compiled = None
 
     def set_gotoshift(self, state, symbol, s):
         '''Add a goto (if symbol is a nonterminal) or shift (if symbol is a
@@ -105,6 +179,7 @@ class ParseTable(object):
         if state in self._GOTOSHIFT: row = self._GOTOSHIFT[state]
         else: row = self._GOTOSHIFT[state] = {}
         row[symbol] = s
+        self._compiled = None
 
     def get_reductions(self, state, symbol):
         '''Get all of the reductions (as a list of production rules) at the
@@ -134,6 +209,18 @@ class ParseTable(object):
         assert symbol.is_nonterminal()
         return self._GOTOSHIFT.get(state, {}).get(symbol, None)
 
+    @property
+    def grammar(self):
+        '''Return the grammar to which this table belongs.'''
+        return self._grammar
+
+    def compile(self):
+        '''Return this parse table as a CompiledParseTable object. The result
+        is cached until the table is modified.'''
+        if self._compiled is None:
+            self._compiled = CompiledParseTable(self)
+        return self._compiled
+
     def to_normal_form(self):
         '''Return this parse table as a ParseTableNormalForm object.'''
         result = ParseTableNormalForm()
@@ -152,6 +239,27 @@ class ParseTable(object):
         '''Tell whether this parse table is equivalent to another one.'''
         return self.to_normal_form().equivalent(other.to_normal_form())
 
+    def statistics(self):
+        '''Return a TableStatistics object describing the size of this table
+        and how much nondeterminism it leaves to the GLR parser.'''
+        states = set(self._REDUCE) | set(self._GOTOSHIFT)
+        for row in self._GOTOSHIFT.itervalues():
+            states.update(row.itervalues())
+        cells = {}
+        for q, row in self._REDUCE.iteritems():
+            for a, cell in row.iteritems():
+                cells[q, a] = len(cell)
+        for q, row in self._GOTOSHIFT.iteritems():
+            for X in row:
+                if X.is_terminal():
+                    cells[q, X] = cells.get((q, X), 0) + 1
+        key = (self.ACCEPT_STATE, END_MARKER)
+        cells[key] = cells.get(key, 0) + 1
+        return TableStatistics(
+            len(states),
+            sum(1 for n in cells.itervalues() if n > 1),
+            max(cells.itervalues()))
+
     def tabbed_str(self):
         '''See ParseTableNormalForm.tabbed_str.'''
         return self.to_normal_form().tabbed_str()
@@ -163,6 +271,378 @@ class ParseTable(object):
     def __str__(self):
         return self.to_normal_form().__str__()
 
+class TableStatistics(object):
+    '''A report on a parse table: the number of states, the number of ACTION
+    cells with more than one action, and the largest number of actions in any
+    ACTION cell. A GLR parser splits its stack at conflicted cells, so tables
+    with fewer conflicts make it do less work.'''
+
+    def __init__(self, num_states, conflicted_cells, max_fanout):
+        self.num_states = num_states
+        self.conflicted_cells = conflicted_cells
+        self.max_fanout = max_fanout
+
+    def __eq__(self, other):
+        return isinstance(other, TableStatistics) and \
+               self._tuple() == other._tuple()
+
+    def __ne__(self, other):
+        return not self.__eq__(other)
+
+    def _tuple(self):
+        return (self.num_states, self.conflicted_cells, self.max_fanout)
+
+    def __repr__(self):
+        return 'TableStatistics(%r, %r, %r)' % self._tuple()
+
+    def __str__(self):
+        return '%d states, %d conflicted cells, max fan-out %d' % self._tuple()
+
+class CompiledParseTable(object):
+    '''A read-only form of ParseTable in which terminals, nonterminals, and
+    production rules are interned to dense integers and the ACTION and GOTO
+    tables are stored in flat arrays indexed by state and symbol number.
+
+    Terminals are numbered in sorted order, followed by the end marker.
+    Nonterminals are numbered in sorted order, and production rules are
+    numbered in the order they appear in the grammar. The reductions of each
+    ACTION cell are stored as a contiguous run of production numbers.'''
+
+    NO_STATE = -1
+
+    def __init__(self, table):
+        '''Compile a ParseTable.'''
+        G = table.grammar
+        self._terminals = sorted(G.terminals) + [END_MARKER]
+        self._nonterminals = sorted(G.nonterminals)
+        self._productions = list(G.productions)
+        self._terminal_ids = { a : i for i, a in enumerate(self._terminals) }
+        self._nonterminal_ids = \
+            { A : i for i, A in enumerate(self._nonterminals) }
+        self._left_sides = array('i',
+            [self._nonterminal_ids[p.left_side] for p in self._productions])
+        self._rule_lengths = array('i',
+            [len(p.right_side) for p in self._productions])
+        states = set(table._REDUCE) | set(table._GOTOSHIFT)
+        for row in table._GOTOSHIFT.itervalues():
+            states.update(row.itervalues())
+        self._num_states = max(states) + 1
+        T = len(self._terminals)
+        N = len(self._nonterminals)
+        self._shifts = array('i', [self.NO_STATE]) * (self._num_states * T)
+        self._gotos = array('i', [self.NO_STATE]) * (self._num_states * N)
+        for q, row in table._GOTOSHIFT.iteritems():
+            for X, s in row.iteritems():
+                if X.is_terminal():
+                    self._shifts[q * T + self._terminal_ids[X]] = s
+                else:
+                    self._gotos[q * N + self._nonterminal_ids[X]] = s
+        self._reduction_offsets = array('i', [0]) * (self._num_states * T + 1)
+        self._reductions = array('i')
+        for q in xrange(self._num_states):
+            row = table._REDUCE.get(q, {})
+            for a in xrange(T):
+                i = q * T + a
+                self._reductions.extend(G.production_index(p) for p in \
+                                        row.get(self._terminals[a], ()))
+                self._reduction_offsets[i + 1] = len(self._reductions)
+        self._end_marker_id = self._terminal_ids[END_MARKER]
+
+    _MAGIC = 'PYCFGTB1'
+    _ARRAYS = ('_left_sides', '_rule_lengths', '_shifts', '_gotos',
+               '_reduction_offsets', '_reductions')
+    _ALIGNMENT = 8
+
+    def save(self, path):
+        '''Write the table to a file in a compact binary format.
+
+        The file begins with a magic string and a pickled header which lists
+        the table's symbols and production rules along with the byte offset
+        and length of each of its integer arrays. The arrays follow, stored
+        raw and aligned to 8 bytes, so they are read back without any
+        decoding.'''
+        with open(path, 'wb') as fout:
+            self._write(fout)
+
+    def _write(self, fout):
+        arrays = [getattr(self, name) for name in self._ARRAYS]
+        layout = []
+        offset = 0
+        for a in arrays:
+            layout.append((offset, len(a)))
+            offset += _aligned(len(a) * a.itemsize, self._ALIGNMENT)
+        header = pickle.dumps({
+            'terminals' : self._terminals,
+            'nonterminals' : self._nonterminals,
+            'productions' : self._productions,
+            'num_states' : self._num_states,
+            'typecode' : arrays[0].typecode,
+            'itemsize' : arrays[0].itemsize,
+            'byteorder' : sys.byteorder,
+            'layout' : layout
+        }, pickle.HIGHEST_PROTOCOL)
+        start = _aligned(len(self._MAGIC) + 4 + len(header), self._ALIGNMENT)
+        fout.write(self._MAGIC)
+        fout.write(struct.pack('<I', len(header)))
+        fout.write(header)
+        fout.write('\0' * (start - len(self._MAGIC) - 4 - len(header)))
+        for a in arrays:
+            fout.write(a.tostring())
+            size = len(a) * a.itemsize
+            fout.write('\0' * (_aligned(size, self._ALIGNMENT) - size))
+
+    @classmethod
+    def load(cls, path):
+        '''Read a table written by save. Raise a ValueError if the file is not
+        a parse table in a format which can be read on this machine.'''
+        with open(path, 'rb') as fin:
+            return cls._read(fin)
+
+    @classmethod
+    def _read(cls, fin):
+        prefix = fin.read(len(cls._MAGIC) + 4)
+        if len(prefix) != len(cls._MAGIC) + 4 or \
+                not prefix.startswith(cls._MAGIC):
+            raise ValueError('file is not a compiled parse table')
+        header_size, = struct.unpack('<I', prefix[len(cls._MAGIC):])
+        try:
+            header = pickle.loads(fin.read(header_size))
+        except Exception:
+            raise ValueError('compiled parse table header is corrupt')
+        try:
+            typecode = header['typecode']
+            itemsize = header['itemsize']
+            layout = header['layout']
+            byteorder = header['byteorder']
+            terminals = header['terminals']
+            nonterminals = header['nonterminals']
+            productions = header['productions']
+            num_states = header['num_states']
+        except (KeyError, TypeError):
+            raise ValueError('compiled parse table header is corrupt')
+        if array(typecode).itemsize != itemsize:
+            raise ValueError('compiled parse table has an incompatible '
+                             'integer size')
+        if len(layout) != len(cls._ARRAYS):
+            raise ValueError('file is not a compiled parse table of this kind')
+        start = _aligned(len(cls._MAGIC) + 4 + header_size, cls._ALIGNMENT)
+        result = cls.__new__(cls)
+        for name, (offset, length) in zip(cls._ARRAYS, layout):
+            a = array(typecode)
+            fin.seek(start + offset)
+            data = fin.read(length * a.itemsize)
+            if len(data) != length * a.itemsize:
+                raise ValueError('compiled parse table is truncated')
+            a.fromstring(data)
+            if byteorder != sys.byteorder:
+                a.byteswap()
+            setattr(result, name, a)
+        result._terminals = terminals
+        result._nonterminals = nonterminals
+        result._productions = productions
+        result._num_states = num_states
+        result._terminal_ids = { a : i for i, a in enumerate(terminals) }
+        result._nonterminal_ids = \
+            { A : i for i, A in enumerate(nonterminals) }
+        if END_MARKER not in result._terminal_ids:
+            raise ValueError('compiled parse table header is corrupt')
+        result._end_marker_id = result._terminal_ids[END_MARKER]
+        return result
+
+    def __getstate__(self):
+        # Tables are pickled in the format written by save, which is much
+        # smaller and faster to read than pickled arrays.
+        buf = StringIO()
+        self._write(buf)
+        return buf.getvalue()
+
+    def __setstate__(self, state):
+        self.__dict__.update(self._read(StringIO(state)).__dict__)
+
+    @property
+    def terminals(self):
+        '''Return the list of terminals, indexed by terminal number.'''
+        return self._terminals
+
+    @property
+    def nonterminals(self):
+        '''Return the list of nonterminals, indexed by nonterminal number.'''
+        return self._nonterminals
+
+    @property
+    def productions(self):
+        '''Return the list of production rules, indexed by production number.
+        '''
+        return self._productions
+
+    @property
+    def num_states(self):
+        '''Return the number of parser states.'''
+        return self._num_states
+
+    @property
+    def end_marker_id(self):
+        '''Return the terminal number of the end marker.'''
+        return self._end_marker_id
+
+    def terminal_id(self, a):
+        '''Return the number of a terminal, or None if it is not a terminal of
+        the grammar.'''
+        return self._terminal_ids.get(a)
+
+    def nonterminal_id(self, A):
+        '''Return the number of a nonterminal, or None if it is not a
+        nonterminal of the grammar.'''
+        return self._nonterminal_ids.get(A)
+
+    def left_side_id(self, p):
+        '''Return the nonterminal number of the left side of production p.'''
+        return self._left_sides[p]
+
+    def rule_length(self, p):
+        '''Return the length of the right side of production p.'''
+        return self._rule_lengths[p]
+
+    def get_reductions(self, state, a):
+        '''Get the production numbers of the reductions in the cell indexed by
+        state and terminal number a.'''
+        i = state * len(self._terminals) + a
+        return self._reductions[self._reduction_offsets[i]:self._reduction_offsets[i + 1]]
+
+    def get_shift(self, state, a):
+        '''Get the shift state in the cell indexed by state and terminal
+        number a, or NO_STATE if there is none.'''
+        return self._shifts[state * len(self._terminals) + a]
+
+    def get_shifts(self, state, a):
+        '''Get the shift states in the cell indexed by state and terminal
+        number a as a list which contains one or no states.'''
+        s = self.get_shift(state, a)
+        if s == self.NO_STATE: return []
+        else: return [s]
+
+    def get_goto(self, state, A):
+        '''Get the goto state in the cell indexed by state and nonterminal
+        number A, or None if there is no such state.'''
+        s = self._gotos[state * len(self._nonterminals) + A]
+        if s == self.NO_STATE: return None
+        else: return s
+
+    def has_accept(self, state, a):
+        '''Tell whether the cell indexed by state and terminal number a has an
+        accept action.'''
+        return state == ParseTable.ACCEPT_STATE and a == self._end_marker_id
+
+    def compile(self):
+        '''Return this table, which is already compiled.'''
+        return self
+
+    def to_normal_form(self):
+        '''Return this parse table as a ParseTableNormalForm object.'''
+        result = ParseTableNormalForm()
+        T = len(self._terminals)
+        N = len(self._nonterminals)
+        for q in xrange(self._num_states):
+            for a, X in enumerate(self._terminals):
+                for p in self.get_reductions(q, a):
+                    result.add_reduction(q, X, p + 1)
+                s = self._shifts[q * T + a]
+                if s != self.NO_STATE:
+                    result.set_gotoshift(q, X, s)
+            for A, X in enumerate(self._nonterminals):
+                s = self._gotos[q * N + A]
+                if s != self.NO_STATE:
+                    result.set_gotoshift(q, X, s)
+        result.set_accept(ParseTable.ACCEPT_STATE, END_MARKER)
+        return result
+
+    def equivalent(self, other):
+        '''Tell whether this parse table is equivalent to another one.'''
+        return self.to_normal_form().equivalent(other.to_normal_form())
+
+    def __str__(self):
+        return self.to_normal_form().__str__()
+
+class RNParseTable(CompiledParseTable):
+    '''A CompiledParseTable which also lists the right-nulled reductions used
+    by the RNGLR algorithm.
+
+    A reduction (p, m) in a cell of the RN table reduces production p after
+    only its first m symbols have been seen, which is allowed when the rest of
+    its right side is nullable. There is one for every item A -> alpha . beta
+    of the state such that alpha has length m and beta is nullable, and its
+    lookaheads are those of the completed item A -> alpha beta . in the state
+    reached on beta, so the RN table may be derived from an SLR, LALR(1), or
+    LR(1) table. Ordinary reductions appear with m equal to the length of the
+    production.'''
+
+    _ARRAYS = CompiledParseTable._ARRAYS + \
+        ('_rn_offsets', '_rn_productions', '_rn_lengths', '_nullable_flags')
+
+    def __init__(self, table):
+        '''Compile a ParseTable along with its right-nulled reductions.'''
+        super(RNParseTable, self).__init__(table)
+        G = table.grammar
+        first, nullable = first_sets(G)
+        self._nullable_flags = array('i',
+            [int(A in nullable) for A in self._nonterminals])
+        T = len(self._terminals)
+        cells = [[] for i in xrange(self._num_states * T)]
+        for i in xrange(self._num_states * T):
+            for p in self._reductions[self._reduction_offsets[i]:self._reduction_offsets[i + 1]]:
+                cells[i].append((p, self._rule_lengths[p]))
+        # Follow each production from every state with a transition on its
+        # left side to find the states in which its items appear.
+        by_left_side = {}
+        for p, rule in enumerate(self._productions):
+            rs = rule.right_side
+            k = len(rs)
+            while k > 0 and rs[k - 1] in nullable:
+                k -= 1
+            if k < len(rs):
+                by_left_side.setdefault(self._left_sides[p], []).append((p, k))
+        added = set()
+        for q in xrange(self._num_states):
+            for A, ps in by_left_side.iteritems():
+                if self.get_goto(q, A) is None: continue
+                for p, k in ps:
+                    states = [q]
+                    for X in self._productions[p].right_side:
+                        if X.is_terminal():
+                            states.append(self.get_shift(states[-1], self._terminal_ids[X]))
+                        else:
+                            states.append(self.get_goto(states[-1], self._nonterminal_ids[X]))
+                    last = states[-1]
+                    for m in xrange(k, len(states) - 1):
+                        if (states[m], p, m) in added: continue
+                        added.add((states[m], p, m))
+                        for a in xrange(T):
+                            if p in self.get_reductions(last, a):
+                                cells[states[m] * T + a].append((p, m))
+        self._rn_offsets = array('i', [0])
+        self._rn_productions = array('i')
+        self._rn_lengths = array('i')
+        for cell in cells:
+            for p, m in cell:
+                self._rn_productions.append(p)
+                self._rn_lengths.append(m)
+            self._rn_offsets.append(len(self._rn_productions))
+
+    def get_rn_reductions(self, state, a):
+        '''Get the reductions in the RN table cell indexed by state and
+        terminal number a as a list of pairs of a production number and the
+        number of symbols to reduce.'''
+        i = state * len(self._terminals) + a
+        j, k = self._rn_offsets[i], self._rn_offsets[i + 1]
+        return zip(self._rn_productions[j:k], self._rn_lengths[j:k])
+
+    def is_nullable(self, A):
+        '''Tell whether the nonterminal numbered A is nullable.'''
+        return bool(self._nullable_flags[A])
+
+def _aligned(size, alignment):
+    return -(-size // alignment) * alignment
+
 class ParseTableNormalForm(object):
     '''A normal form for multi-valued SLR parse tables which facilitates
     comparisons between different parse table representations.'''
@@ -297,61 +777,83 @@ class ParseTableNormalForm(object):
         states = sorted(m.keys())
         return map(str, symbols), [(str(i), [','.join(map(str, m[i][X])) for X in symbols]) for i in states]
 
-def _build_slr_table(G, follow):
-    '''Construct an SLR table for a grammar. Its follow sets must be provided.
+def _lr0_automaton(G):
+    '''Construct the LR(0) state machine of a grammar. State 0 is the initial
+    state, and state 1 is the state reached from it on the start symbol, in
+    which the accept action is placed. Return a pair of lists indexed by state.
+    The first gives the transitions of each state as a dict mapping symbols to
+    states, and the second lists the production rules completed in each state.
+    Items are kept in the order in which they are found, each only once, so a
+    rule which occurs more than once in the grammar is reduced only once.
     '''
-    table = ParseTable(G)
-    P = { A : [] for A in G.nonterminals }
-    for p in G.productions: P[p.left_side].append(p)
-    def CLOSE(s):
+    S = G.start
+    kernels = [[(p, 0) for p in G.productions_with_left_side(S)], []]
+    index = {}
+    gotos = []
+    completed = []
+    s = 0
+    while s < len(kernels):
+        d = { S : [] } if s == 0 else {}
+        closed = set([S]) if s == 0 else set()
+        reductions = []
+        items = set()
+        Q = deque()
+        def add_item(item):
+            if item not in items:
+                items.add(item)
+                Q.append(item)
+        for item in kernels[s]:
+            add_item(item)
         while Q:
             p, i = Q.popleft()
-            A = p.left_side
             if i < len(p.right_side):
                 X = p.right_side[i]
-                if X.is_nonterminal() and X not in d:
-                    for r in P[X]:
-                        Q.append((r, 0))
-                if X not in d: dX = d[X] = set()
-                else: dX = d[X]
-                dX.add((p, i + 1))
+                if X.is_nonterminal() and X not in closed:
+                    closed.add(X)
+                    for r in G.productions_with_left_side(X):
+                        add_item((r, 0))
+                if X in d: d[X].append((p, i + 1))
+                else: d[X] = [(p, i + 1)]
             else:
-                for a in follow[A]:
-                    table.add_reduction(s, a, p)
-    def PROCESS(s):
-        d.clear()
-        CLOSE(s)
-        for X, IX in d.items():
-            key = frozenset(IX)
-            if key in I:
-                j = I[key]
+                reductions.append(p)
+        row = {}
+        for X, items in d.items():
+            if s == 0 and X == S:
+                kernels[1] = items
+                row[X] = 1
             else:
-                j = len(I) + 2
-                I[key] = j
-                states.append((key, j))
-            table.set_gotoshift(s, X, j)
-    S = G.start
-    states = deque()
-    I = {}
-    d = { S : set() }
-    Q = deque((p, 0) for p in P[G.start])
-    CLOSE(0)
-    Q.extend(d[S])
-    del d[S]
-    table.set_gotoshift(0, S, 1)
-    for X, IX in d.items():
-        key = frozenset(IX)
-        j = len(I) + 2
-        I[key] = j
-        states.append((key, j))
-        table.set_gotoshift(0, X, j)
-    PROCESS(1)
-    while states:
-        Is, s = states.popleft()
-        Q.extend(Is)
-        PROCESS(s)
+                key = frozenset(items)
+                if key in index:
+                    row[X] = index[key]
+                else:
+                    row[X] = index[key] = len(kernels)
+                    kernels.append(items)
+        gotos.append(row)
+        completed.append(reductions)
+        s += 1
+    return gotos, completed
+
+def _fill_table(G, gotos, reductions):
+    '''Build a ParseTable from the transitions of a state machine and, for
+    each state, a list of pairs containing a production rule and the
+    terminals on which it is reduced.'''
+    table = ParseTable(G)
+    for s, row in enumerate(gotos):
+        for X, t in row.iteritems():
+            table.set_gotoshift(s, X, t)
+    for s, cell in enumerate(reductions):
+        for p, lookaheads in cell:
+            for a in lookaheads:
+                table.add_reduction(s, a, p)
     return table
 
+def _build_slr_table(G, follow):
+    '''Construct an SLR table for a grammar. Its follow sets must be provided.
+    '''
+    gotos, completed = _lr0_automaton(G)
+    return _fill_table(G, gotos,
+        [[(p, follow[p.left_side]) for p in ps] for ps in completed])
+
 def build_slr_table(G, follow=None):
     '''Compute the SLR table for a grammar, computing first and follow sets as
     needed in case the follow sets are not provided.'''
@@ -359,3 +861,294 @@ def build_slr_table(G, follow=None):
         follow = follow_sets(G, *first_sets(G))
     return _build_slr_table(G, follow)
 
+def load_or_build_table(G, cache_dir, kind='slr'):
+    '''Return the compiled parse table of some kind for a grammar, where kind
+    is a key of TABLE_BUILDERS, looking it up in a cache directory under the
+    grammar's fingerprint. On a miss the table is built, compiled, and saved
+    there for next time, creating the directory if it does not exist. Since
+    the fingerprint changes whenever the grammar does, stale tables are never
+    loaded, and a corrupt table file is rebuilt.'''
+    path = os.path.join(cache_dir, '%s-%s.table' % (kind, G.fingerprint()))
+    try:
+        return CompiledParseTable.load(path)
+    except (IOError, ValueError):
+        pass
+    table = build_table(G, kind).compile()
+    try:
+        os.makedirs(cache_dir)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise
+    # Write to a temporary file and rename it so that concurrent readers
+    # never see a partially written table.
+    fd, temp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as fout:
+            table._write(fout)
+        os.rename(temp_path, path)
+    except:
+        os.remove(temp_path)
+        raise
+    return table
+
+def _lalr_lookaheads(G, gotos, completed, nullable):
+    '''Compute the LALR(1) lookahead sets of the completed items of an LR(0)
+    state machine using the relations of DeRemer and Pennello. Return a list
+    which gives, for each state, pairs of production rules and lookaheads.'''
+    # Nonterminal transitions (s, A) are the vertices of the reads and
+    # includes relations.
+    transitions = [(s, X) for s, row in enumerate(gotos)
+                   for X in row if X.is_nonterminal()]
+    # DR(s, A) is the set of terminals which can be shifted right after the
+    # transition. The accept action counts as a shift of the end marker.
+    # Terminal sets are represented as integer bitsets.
+    index = _terminal_index(G)
+    read = {}
+    for s, A in transitions:
+        r = gotos[s][A]
+        read[s, A] = index.encode(X for X in gotos[r] if X.is_terminal())
+        if s == 0 and A == G.start:
+            read[s, A] |= index.bit(END_MARKER)
+    # (s, A) reads (r, C) if C is nullable and there is a transition on C
+    # from the state r reached on A.
+    def reads(t):
+        r = gotos[t[0]][t[1]]
+        return [(r, C) for C in gotos[r] if C in nullable]
+    union_closure(transitions, reads, read)
+    # (q, B) includes (s, A) if A -> beta B gamma, gamma is nullable, and
+    # beta leads from s to q. The completed item A -> omega in state q looks
+    # back to (s, A) if omega leads from s to q.
+    includes = { t : [] for t in transitions }
+    lookback = {}
+    for s, A in transitions:
+        for p in G.productions_with_left_side(A):
+            rs = p.right_side
+            k = len(rs)
+            while k > 0 and rs[k - 1] in nullable:
+                k -= 1
+            q = s
+            for i, X in enumerate(rs):
+                if X.is_nonterminal() and i + 1 >= k:
+                    includes[q, X].append((s, A))
+                q = gotos[q][X]
+            lookback.setdefault((q, p), []).append((s, A))
+    follow = union_closure(transitions, includes.__getitem__, read)
+    # Many items share the same lookaheads, so each distinct bitset is decoded
+    # only once.
+    decoded = {}
+    result = []
+    for q, ps in enumerate(completed):
+        cell = []
+        for p in ps:
+            lookaheads = 0
+            for t in lookback.get((q, p), ()):
+                lookaheads |= follow[t]
+            if lookaheads not in decoded:
+                decoded[lookaheads] = frozenset(index.decode(lookaheads))
+            cell.append((p, decoded[lookaheads]))
+        result.append(cell)
+    return result
+
+def build_lalr_table(G):
+    '''Compute the LALR(1) table for a grammar. It is built on the same LR(0)
+    state machine as the SLR table, with the same state numbering, but the
+    lookaheads of its reductions are computed with the lookahead propagation
+    method of DeRemer and Pennello instead of with follow sets, so it has the
+    same or fewer conflicts.'''
+    nullable = _nullable_nonterminals(G.productions, G.nonterminals)
+    gotos, completed = _lr0_automaton(G)
+    return _fill_table(G, gotos,
+                       _lalr_lookaheads(G, gotos, completed, nullable))
+
+def _lr1_automaton(G, suffix_first):
+    '''Construct the canonical LR(1) state machine of a grammar, numbering
+    the states as in _lr0_automaton. Return a triple of lists indexed by state.
+    The first gives the transitions of each state, the second lists pairs of
+    completed production rules and their lookahead sets, and the third gives
+    the core of each state, which is the set of its LR(0) kernel items. The
+    first sets of the production rule suffixes must be given, as computed by
+    suffix_first_sets.'''
+    S = G.start
+    kernels = [[(p, 0, END_MARKER) for p in G.productions_with_left_side(S)], []]
+    index = {}
+    gotos = []
+    completed = []
+    cores = []
+    s = 0
+    while s < len(kernels):
+        # Close the kernel, propagating only newly added lookaheads.
+        items = {}
+        order = []
+        Q = deque()
+        for p, i, a in kernels[s]:
+            if (p, i) not in items:
+                items[p, i] = set()
+                order.append((p, i))
+            if a not in items[p, i]:
+                items[p, i].add(a)
+                Q.append((p, i, set([a])))
+        while Q:
+            p, i, new = Q.popleft()
+            if i < len(p.right_side) and p.right_side[i].is_nonterminal():
+                F, empty = suffix_first[p, i + 1]
+                lookaheads = F | new if empty else F
+                for r in G.productions_with_left_side(p.right_side[i]):
+                    if (r, 0) not in items:
+                        items[r, 0] = set()
+                        order.append((r, 0))
+                    added = lookaheads - items[r, 0]
+                    if added:
+                        items[r, 0] |= added
+                        Q.append((r, 0, added))
+        d = { S : [] } if s == 0 else {}
+        reductions = []
+        for p, i in order:
+            if i < len(p.right_side):
+                X = p.right_side[i]
+                if X not in d: d[X] = []
+                d[X].extend((p, i + 1, a) for a in items[p, i])
+            else:
+                reductions.append((p, items[p, i]))
+        row = {}
+        for X, next_kernel in d.items():
+            if s == 0 and X == S:
+                kernels[1] = next_kernel
+                row[X] = 1
+            else:
+                key = frozenset(next_kernel)
+                if key in index:
+                    row[X] = index[key]
+                else:
+                    row[X] = index[key] = len(kernels)
+                    kernels.append(next_kernel)
+        gotos.append(row)
+        completed.append(reductions)
+        if s <= 1:
+            cores.append(s)
+        else:
+            cores.append(frozenset((p, i) for p, i, a in kernels[s]))
+        s += 1
+    return gotos, completed, cores
+
+def build_lr1_table(G):
+    '''Compute the canonical LR(1) table for a grammar.'''
+    first, nullable = first_sets(G)
+    gotos, completed, cores = \
+        _lr1_automaton(G, suffix_first_sets(G, first, nullable))
+    return _fill_table(G, gotos, completed)
+
+def _state_actions(gotos, completed, s):
+    # Map each terminal to the set of actions in its ACTION cell. Shift
+    # targets are left out, since states with the same core shift to states
+    # with the same core.
+    result = {}
+    for X in gotos[s]:
+        if X.is_terminal():
+            result[X] = set([('shift',)])
+    for p, lookaheads in completed[s]:
+        for a in lookaheads:
+            result.setdefault(a, set()).add(('reduce', p))
+    return result
+
+def _merge_adds_conflict(actions, members, s):
+    # Tell whether merging state s into a group of states would create a
+    # conflicted cell which none of the merged states already has.
+    for a in set(actions[s]).union(*(actions[t] for t in members)):
+        union = actions[s].get(a, set()).union(
+            *(actions[t].get(a, ()) for t in members))
+        if len(union) > 1 and not any(
+                actions[t].get(a) == union for t in members + [s]):
+            return True
+    return False
+
+def _merge_states(actions, states):
+    # Greedily merge a list of states with the same core into groups.
+    groups = []
+    for s in states:
+        for group in groups:
+            if not _merge_adds_conflict(actions, group, s):
+                group.append(s)
+                break
+        else:
+            groups.append([s])
+    return groups
+
+def build_minimal_lr1_table(G):
+    '''Compute a minimal LR(1) table for a grammar. States of the canonical
+    LR(1) machine with the same core are merged, as in LALR(1), but only as
+    long as merging does not create a conflicted cell which the canonical
+    machine does not have, so the table has no more conflicts than the
+    canonical LR(1) table and, for most grammars, as few states as the LALR(1)
+    table.'''
+    first, nullable = first_sets(G)
+    gotos, completed, cores = \
+        _lr1_automaton(G, suffix_first_sets(G, first, nullable))
+    n = len(gotos)
+    actions = [_state_actions(gotos, completed, s) for s in xrange(n)]
+    by_core = {}
+    for s in xrange(n):
+        by_core.setdefault(cores[s], []).append(s)
+    groups = [g for states in by_core.itervalues()
+              for g in _merge_states(actions, states)]
+    # Split groups until the states in every group have transitions to the
+    # same groups, and regroup any group whose merge became conflicted.
+    while True:
+        block = {}
+        for i, group in enumerate(groups):
+            for s in group:
+                block[s] = i
+        refined = []
+        for group in groups:
+            parts = {}
+            for s in group:
+                key = tuple(sorted((X, block[t]) for X, t in gotos[s].iteritems()))
+                parts.setdefault(key, []).append(s)
+            for part in parts.itervalues():
+                part.sort()
+                if len(part) > 1 and any(
+                        _merge_adds_conflict(actions, part[:i], part[i])
+                        for i in xrange(1, len(part))):
+                    refined.extend(_merge_states(actions, part))
+                else:
+                    refined.append(part)
+        if len(refined) == len(groups):
+            break
+        groups = refined
+    # Number the merged states in order of their lowest original state.
+    groups.sort(key=min)
+    block = {}
+    for i, group in enumerate(groups):
+        for s in group:
+            block[s] = i
+    merged_gotos = []
+    merged_completed = []
+    for group in groups:
+        merged_gotos.append(
+            { X : block[t] for X, t in gotos[group[0]].iteritems() })
+        lookaheads = {}
+        for s in group:
+            for p, L in completed[s]:
+                lookaheads.setdefault(p, set()).update(L)
+        merged_completed.append(lookaheads.items())
+    return _fill_table(G, merged_gotos, merged_completed)
+
+TABLE_BUILDERS = {
+    'slr' : build_slr_table,
+    'lalr' : build_lalr_table,
+    'lr1' : build_lr1_table,
+    'minimal-lr1' : build_minimal_lr1_table
+}
+
+def build_table(G, kind='slr'):
+    '''Compute a parse table for a grammar. kind names the kind of table to
+    build and must be a key of TABLE_BUILDERS.'''
+    try:
+        builder = TABLE_BUILDERS[kind]
+    except KeyError:
+        raise ValueError('unknown parse table kind %r' % (kind,))
+    return builder(G)
+
+def build_rn_table(G, kind='slr'):
+    '''Compute an RNParseTable for a grammar from a parse table of some kind,
+    which must be a key of TABLE_BUILDERS.'''
+    return RNParseTable(build_table(G, kind))
@@ -0,0 +1,160 @@
+'''Recognition of context free languages by boolean matrix multiplication,
+after Valiant, in the formulation of Okhotin ("Parsing by matrix
+multiplication generalized to Boolean grammars", 2014).
+
+Grammars must be in Chomsky normal form, as for the cyk module. For an input
+string of length n, the positions 0 to n are padded to a power of two, N, and
+the table is an array of bools of shape (|N|, N, N) whose entry [A, i, j]
+tells whether nonterminal A derives the symbols of the input from position i
+up to position j. The product of two such tables X and Y has the entries
+[A, i, j] such that, for some rule A -> BC and some k, X[B, i, k] and
+Y[C, k, j] hold. It is computed with one NumPy matrix product for each pair
+(B, C) of right side symbols.
+
+The table is filled in by dividing it recursively into square blocks. Each
+block is computed by multiplying the blocks between it and the diagonal, so
+most of the work is done by products of large matrices, and the running time
+is that of multiplying boolean matrices of size n, times log n. Blocks of
+leaf_size or fewer positions are filled in directly, a group of independent
+entries at a time.'''
+
+import numpy
+from cfg.cyk import compile_grammar
+
+LEAF_SIZE = 32
+
+def recognize(grammar, input_string, leaf_size=LEAF_SIZE):
+    '''Decide whether an input string of Terminals is in the language of a
+    grammar in Chomsky normal form or a CYKGrammar.'''
+    return _Recognizer(compile_grammar(grammar), leaf_size).run(list(input_string))
+
+def valiant_table(grammar, input_string, leaf_size=LEAF_SIZE):
+    '''Compute the table of an input string of Terminals with respect to a
+    grammar in Chomsky normal form or a CYKGrammar, as described above.
+    Nonterminals are numbered as in the CYKGrammar. Return None if the input
+    contains a symbol which no rule derives.'''
+    return _Recognizer(compile_grammar(grammar), leaf_size).table(list(input_string))
+
+class _Recognizer(object):
+
+    def __init__(self, grammar, leaf_size):
+        if leaf_size < 2:
+            raise ValueError('leaf size must be at least 2')
+        self._grammar = grammar
+        self._left, self._right = grammar.rule_pairs
+        self._heads = grammar.rule_heads
+        self._leaf_size = leaf_size
+        self._sweeps = {}
+
+    def run(self, w):
+        M = self._grammar
+        if not w:
+            return M.accepts_empty
+        T = self.table(w)
+        return T is not None and bool(T[M.start_index, 0, len(w)])
+
+    def table(self, w):
+        M = self._grammar
+        n = len(w)
+        size = 1
+        while size < n + 1:
+            size *= 2
+        T = self._T = numpy.zeros((len(M.nonterminals), size, size), bool)
+        for i, a in enumerate(w):
+            row = M.terminal_row(a)
+            if row is None:
+                return None
+            T[:, i, i + 1] = row
+        if len(self._left):
+            self._compute(0, size)
+        return T
+
+    def _compute(self, l, m):
+        # Compute the entries [i, j] with l <= i < j < m, given the entries
+        # for the spans of length 1.
+        if m - l <= self._leaf_size:
+            block = self._T[:, l:m, l:m]
+            block[...] = \
+                self._complete_cells(block, self._diagonal_sweep(m - l))
+        else:
+            mid = (l + m) // 2
+            self._compute(l, mid)
+            self._compute(mid, m)
+            self._complete(l, mid, mid, m)
+
+    def _complete(self, l, m, l2, m2):
+        # Compute the block of entries [i, j] with l <= i < m and
+        # l2 <= j < m2, where m <= l2. The entries [i, j] with both i and j
+        # in [l, m) or both in [l2, m2) must be known, and the contributions
+        # of the splits at the positions k with m <= k < l2 must already be
+        # in the block.
+        T = self._T
+        s = m - l
+        if s <= self._leaf_size:
+            # Gather the rows and columns of both ranges of positions, so that
+            # the block is the upper right quarter.
+            positions = numpy.r_[l:m, l2:m2]
+            local = T[:, positions[:, None], positions[None, :]]
+            T[:, l:m, l2:m2] = \
+                self._complete_cells(local, self._corner_sweep(s))[:, :s, s:]
+            return
+        h = s // 2
+        r = l + h
+        c = l2 + h
+        self._complete(r, m, l2, c)
+        T[:, l:r, l2:c] |= self._product((l, r), (r, m), (l2, c))
+        self._complete(l, r, l2, c)
+        T[:, r:m, c:m2] |= self._product((r, m), (l2, c), (c, m2))
+        self._complete(r, m, c, m2)
+        T[:, l:r, c:m2] |= self._product((l, r), (r, m), (c, m2))
+        T[:, l:r, c:m2] |= self._product((l, r), (l2, c), (c, m2))
+        self._complete(l, r, c, m2)
+
+    def _product(self, rows, middle, cols):
+        # Multiply the blocks [rows, middle] and [middle, cols] of the table,
+        # where each argument is a range of positions.
+        X = self._T[:, rows[0]:rows[1], middle[0]:middle[1]]
+        Y = self._T[:, middle[0]:middle[1], cols[0]:cols[1]]
+        counts = numpy.matmul(X[self._left].astype(numpy.float32),
+                              Y[self._right].astype(numpy.float32))
+        return numpy.tensordot(self._heads.T, counts > 0, 1) > 0
+
+    def _diagonal_sweep(self, s):
+        # List the groups of entries of a table of s positions in the order
+        # in which they are computed, which is by the length of their spans.
+        # Spans of length 1 are given.
+        key = 'diagonal', s
+        if key not in self._sweeps:
+            self._sweeps[key] = [(numpy.arange(s - k), numpy.arange(k, s))
+                                 for k in xrange(2, s)]
+        return self._sweeps[key]
+
+    def _corner_sweep(self, s):
+        # List the groups of entries of the upper right quarter of a table of
+        # 2s positions, a diagonal at a time, starting from the corner nearest
+        # the diagonal of the table. Every split of an entry [i, j] of the
+        # quarter lies in [i + 1, s) or [s, j), so it depends only on entries
+        # which are nearer to that corner.
+        key = 'corner', s
+        if key not in self._sweeps:
+            sweep = []
+            for d in xrange(2 * s - 1):
+                x = numpy.arange(max(0, d - s + 1), min(d, s - 1) + 1)
+                sweep.append((s - 1 - x, s + d - x))
+            self._sweeps[key] = sweep
+        return self._sweeps[key]
+
+    def _complete_cells(self, block, sweep):
+        # Add to the entries of a square block of the table, in the order of
+        # the groups of entries in sweep, the contributions of the splits at
+        # all of the block's positions. Entries [i, k] with k <= i and [k, j]
+        # with k >= j are always empty, so the splits outside of each span
+        # contribute nothing. Return the completed block.
+        block = block.astype(numpy.float32)
+        for i, j in sweep:
+            left = block[:, i, :].transpose(1, 0, 2)
+            right = block[:, :, j].transpose(2, 1, 0)
+            found = numpy.matmul(left, right)[:, self._left, self._right] > 0
+            block[:, i, j] += numpy.dot(found.astype(numpy.float32),
+                                        self._heads).T
+        return block > 0
@@ -0,0 +1,133 @@
+'''Probabilistic disambiguation of the packed shared parse forests produced by
+the GLR algorithms.
+
+Probabilities are attached to production rules with a mapping from
+ProductionRule objects to numbers, so the same grammar may be used with
+different models. The probability of a parse tree is the product of the
+probabilities of the rules used at its internal nodes. The most probable
+trees are found by glr.best_trees with the score function returned by
+log_probability_score, which best_tree applies to every root of a forest,
+and inside_outside visits every vertex and alternative of the forest a
+bounded number of times.'''
+
+import math
+from util.digraph import strongly_connected_components
+from cfg.core import ProductionRule
+from cfg.glr import best_trees, forest_successors, is_cycle, \
+                    alternative_symbols
+
+def log_probability_score(weights):
+    '''Return a function which maps production rules to the natural
+    logarithms of their probabilities in a mapping of production rules to
+    probabilities, for use as the score function of glr.best_trees. The
+    score of a tree is then the logarithm of its probability, so that
+    best_trees(v, 1, log_probability_score(weights)) finds the most probable
+    tree encoded by vertex v, and probabilities do not underflow on long
+    inputs. The function raises a ValueError for a rule which has no
+    probability. Trees of probability 0 get the score float('-inf').'''
+    return _LogWeights(weights).of_rule
+
+def best_tree(roots, weights):
+    '''Find the most probable parse tree encoded in a forest, given as a list
+    of root vertices such as the one returned by glr_parse, and a mapping of
+    production rules to probabilities. Return a pair containing the natural
+    logarithm of the tree's probability and the tree. Raise a ValueError if
+    a rule in the forest has no probability, a rule on a cycle of the forest
+    has a probability greater than 1, or the forest has no tree of nonzero
+    probability.'''
+    score = log_probability_score(weights)
+    candidates = [x for v in roots for x in best_trees(v, 1, score)]
+    best = max(candidates or [(float('-inf'), None)], key=lambda x: x[0])
+    if best[0] == float('-inf'):
+        raise ValueError('the forest has no tree of nonzero probability')
+    return best
+
+def inside_outside(roots, weights):
+    '''Compute the marginal probability of every vertex of an acyclic forest,
+    given as a list of root vertices, with respect to a mapping of production
+    rules to probabilities. The marginal probability of a vertex is the total
+    probability of the trees which use it divided by the total probability of
+    all trees in the forest, where a tree which uses a vertex more than once,
+    as may happen with the epsilon vertices of RNGLR, counts once per use.
+    Return a pair containing the total probability and a dict mapping
+    vertices to their marginal probabilities. Raise a ValueError if the
+    forest is cyclic or a rule in it has no probability.'''
+    components = strongly_connected_components(roots, forest_successors)
+    if any(is_cycle(c) for c in components):
+        raise ValueError('inside-outside probabilities require an acyclic '
+                         'forest')
+    order = [u for u, in components]
+    weight = _Weights(weights)
+    # Inside probabilities, computed from the leaves up.
+    inside = {}
+    for u in order:
+        if u.children:
+            total = 0.0
+            for alt in u.children:
+                product = weight.of(u, alt)
+                for c in alt:
+                    product *= inside[c]
+                total += product
+            inside[u] = total
+        else:
+            inside[u] = 1.0
+    # Outside probabilities, computed from the roots down. The product of the
+    # inside probabilities of the other children of each alternative is
+    # found with prefix and suffix products.
+    outside = dict.fromkeys(order, 0.0)
+    for v in set(roots):
+        outside[v] += 1.0
+    for u in reversed(order):
+        if not outside[u]:
+            continue
+        for alt in u.children:
+            n = len(alt)
+            suffix = [1.0] * (n + 1)
+            for i in xrange(n - 1, -1, -1):
+                suffix[i] = suffix[i + 1] * inside[alt[i]]
+            prefix = outside[u] * weight.of(u, alt)
+            for i, c in enumerate(alt):
+                outside[c] += prefix * suffix[i + 1]
+                prefix *= inside[c]
+    total = sum(inside[v] for v in set(roots))
+    if total == 0:
+        return total, dict.fromkeys(order, 0.0)
+    return total, { u : inside[u] * outside[u] / total for u in order }
+
+class _Weights(object):
+    # Look up the probability of the production rule of an alternative,
+    # caching rule objects by the symbols involved.
+
+    def __init__(self, weights):
+        self._weights = weights
+        self._cache = {}
+
+    def of(self, u, alt):
+        # The alternatives of intermediate vertices are parts of the
+        # alternatives of their parents, whose rules carry the probability.
+        if u.intermediate:
+            return self._convert(1.0)
+        return self._lookup(u.symbol, alternative_symbols(alt))
+
+    def of_rule(self, rule):
+        return self._lookup(rule.left_side, rule.right_side)
+
+    def _lookup(self, left_side, right_side):
+        key = (left_side,) + tuple(right_side)
+        try:
+            return self._cache[key]
+        except KeyError:
+            rule = ProductionRule(left_side, right_side)
+            try:
+                result = self._cache[key] = self._convert(self._weights[rule])
+            except KeyError:
+                raise ValueError('no probability is given for %s' % rule)
+            return result
+
+    def _convert(self, p):
+        return p
+
+class _LogWeights(_Weights):
+
+    def _convert(self, p):
+        return math.log(p) if p > 0 else float('-inf')
@@ -0,0 +1,87 @@
+'''Sets of items drawn from a fixed collection, represented as integers.'''
+
+from collections import Mapping
+
+class BitsetIndex(object):
+    '''Assigns a bit to each of a fixed sequence of items, so that sets of
+    those items can be represented as integers and combined with the |, &,
+    and ~ operators. Bits are assigned in the order of the items, so an index
+    made from a longer sequence with the same beginning gives the same bits
+    to the items they share.'''
+
+    def __init__(self, items):
+        '''Initialize an index for a sequence of distinct hashable items.'''
+        self._items = list(items)
+        self._bits = { x : 1 << i for i, x in enumerate(self._items) }
+
+    @property
+    def items(self):
+        '''Return the list of items, in the order of their bits.'''
+        return self._items
+
+    def bit(self, x):
+        '''Return the integer whose only set bit is that of item x.'''
+        return self._bits[x]
+
+    def encode(self, items):
+        '''Return the integer representing a collection of items.'''
+        result = 0
+        bits = self._bits
+        for x in items:
+            result |= bits[x]
+        return result
+
+    def decode(self, bits):
+        '''Return the set of items represented by an integer.'''
+        result = set()
+        items = self._items
+        while bits:
+            low = bits & -bits
+            result.add(items[low.bit_length() - 1])
+            bits ^= low
+        return result
+
+    def __contains__(self, x):
+        return x in self._bits
+
+    def __len__(self):
+        return len(self._items)
+
+class BitsetMap(Mapping):
+    '''A read-only mapping whose values are sets stored as integers with
+    respect to a BitsetIndex. Looking up a key gives a frozenset, which is
+    decoded the first time it is needed, and the integer itself is available
+    through bits.'''
+
+    def __init__(self, index, bits):
+        '''Initialize a view of a dict mapping keys to integers with respect
+        to a BitsetIndex.'''
+        self._index = index
+        self._bits = bits
+        self._sets = {}
+
+    @property
+    def index(self):
+        '''Return the BitsetIndex of the values.'''
+        return self._index
+
+    def bits(self, key):
+        '''Return the integer representing the set stored under a key.'''
+        return self._bits[key]
+
+    def __getitem__(self, key):
+        try:
+            return self._sets[key]
+        except KeyError:
+            result = self._sets[key] = \
+                frozenset(self._index.decode(self._bits[key]))
+            return result
+
+    def __iter__(self):
+        return iter(self._bits)
+
+    def __len__(self):
+        return len(self._bits)
+
+    def __contains__(self, key):
+        return key in self._bits
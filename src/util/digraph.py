@@ -156,3 +156,94 @@ def is_cyclic_multi(roots, successor_func):
         return False
     return visit(roots)
 
+
+def union_closure(vertices, successors, values):
+    '''The Digraph algorithm of DeRemer and Pennello. Given a relation R,
+    defined by a successor function, and a mapping of vertices to initial
+    values, replace the value of every vertex x reachable from the given
+    vertices with the union of the initial values of all vertices reachable
+    from x, including x itself. Values are combined with the | operator, so
+    they may be sets or integer bitsets. Every strongly connected component
+    is visited once, so the running time is linear in the size of the
+    relation. Vertices in the same strongly connected component end up sharing
+    the same value object. Return the mapping of values.'''
+    depth = {}
+    stack = []
+    for x in vertices:
+        if x in depth:
+            continue
+        stack.append(x)
+        depth[x] = len(stack)
+        work = [(x, len(stack), iter(successors(x)))]
+        while work:
+            v, d, children = work[-1]
+            for y in children:
+                if y not in depth:
+                    stack.append(y)
+                    depth[y] = len(stack)
+                    work.append((y, len(stack), iter(successors(y))))
+                    break
+                if depth[y] < depth[v]:
+                    depth[v] = depth[y]
+                values[v] = values[v] | values[y]
+            else:
+                work.pop()
+                if depth[v] == d:
+                    while True:
+                        top = stack.pop()
+                        depth[top] = float('inf')
+                        values[top] = values[v]
+                        if top == v:
+                            break
+                if work:
+                    u = work[-1][0]
+                    if depth[v] < depth[u]:
+                        depth[u] = depth[v]
+                    values[u] = values[u] | values[v]
+    return values
+
+def strongly_connected_components(vertices, successors):
+    '''Find the strongly connected components of the part of a graph which is
+    reachable from some vertices, given a successor function, using Tarjan's
+    algorithm without recursion. Return a list of the components as lists of
+    vertices, in which every component comes after all of the components
+    reachable from it.'''
+    index = {}
+    low = {}
+    stack = []
+    on_stack = set()
+    result = []
+    for x in vertices:
+        if x in index:
+            continue
+        index[x] = low[x] = len(index)
+        stack.append(x)
+        on_stack.add(x)
+        work = [(x, iter(successors(x)))]
+        while work:
+            v, children = work[-1]
+            for y in children:
+                if y not in index:
+                    index[y] = low[y] = len(index)
+                    stack.append(y)
+                    on_stack.add(y)
+                    work.append((y, iter(successors(y))))
+                    break
+                if y in on_stack and index[y] < low[v]:
+                    low[v] = index[y]
+            else:
+                work.pop()
+                if low[v] == index[v]:
+                    component = []
+                    while True:
+                        top = stack.pop()
+                        on_stack.remove(top)
+                        component.append(top)
+                        if top is v:
+                            break
+                    result.append(component)
+                if work:
+                    u = work[-1][0]
+                    if low[v] < low[u]:
+                        low[u] = low[v]
+    return result
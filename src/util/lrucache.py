@@ -0,0 +1,94 @@
+'''A bounded mapping which discards its least recently used entries.'''
+
+from collections import OrderedDict
+
+class LRUCache(object):
+    '''A mapping of bounded size. When an entry is added to a full cache, the
+    entry which was least recently looked up or added is discarded. The cache
+    counts the lookups which found an entry (hits) and those which did not
+    (misses).'''
+
+    def __init__(self, maxsize=128):
+        '''Initialize an empty cache which holds at most maxsize entries.'''
+        if maxsize < 1:
+            raise ValueError('maxsize must be positive')
+        self._maxsize = maxsize
+        self._entries = OrderedDict()
+        self._hits = 0
+        self._misses = 0
+
+    @property
+    def maxsize(self):
+        '''Return the maximum number of entries in the cache.'''
+        return self._maxsize
+
+    @maxsize.setter
+    def maxsize(self, maxsize):
+        '''Change the maximum number of entries in the cache, discarding the
+        least recently used entries if there are now too many.'''
+        if maxsize < 1:
+            raise ValueError('maxsize must be positive')
+        self._maxsize = maxsize
+        self._trim()
+
+    @property
+    def hits(self):
+        '''Return the number of lookups which found an entry.'''
+        return self._hits
+
+    @property
+    def misses(self):
+        '''Return the number of lookups which did not find an entry.'''
+        return self._misses
+
+    def get(self, key, default=None):
+        '''Look up the value stored under a key, marking it as the most
+        recently used entry, or return default if there is none.'''
+        try:
+            value = self._entries.pop(key)
+        except KeyError:
+            self._misses += 1
+            return default
+        self._entries[key] = value
+        self._hits += 1
+        return value
+
+    def put(self, key, value):
+        '''Store a value under a key as the most recently used entry.'''
+        self._entries.pop(key, None)
+        self._entries[key] = value
+        self._trim()
+
+    def get_or_compute(self, key, compute):
+        '''Look up the value stored under a key. If there is none, call
+        compute with no arguments and store and return its result.'''
+        try:
+            value = self._entries.pop(key)
+        except KeyError:
+            self._misses += 1
+            value = compute()
+        else:
+            self._hits += 1
+        self._entries[key] = value
+        self._trim()
+        return value
+
+    def clear(self):
+        '''Remove all entries and reset the hit and miss counters.'''
+        self._entries.clear()
+        self._hits = 0
+        self._misses = 0
+
+    def _trim(self):
+        while len(self._entries) > self._maxsize:
+            self._entries.popitem(last=False)
+
+    def __contains__(self, key):
+        return key in self._entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __repr__(self):
+        return 'LRUCache(maxsize=%d, size=%d, hits=%d, misses=%d)' % \
+            (self._maxsize, len(self._entries), self._hits, self._misses)
@@ -4,6 +4,8 @@ class Comparable(object):
     '''A mixin class which defines all of the rich comparison methods in terms
     of the __eq__ and __lt__ methods.'''
 
+    __slots__ = ()
+
     def __ne__(self, y):
         return not self.__eq__(y)
 
@@ -20,6 +22,8 @@ class Keyed(object):
     '''A mixin class which defines hash value and equality methods in terms of
     a single __key__ method.'''
 
+    __slots__ = ()
+
     def __lt__(self, y):
         return self.__key__().__lt__(y.__key__())
 
@@ -50,7 +54,7 @@ class Subscripted(object):
     def __eq__(self, y):
         '''Two subscripted objects must have equal values and equal subscripts
         to be equal.'''
-        return isinstance(y, Subscripted) and \
+        return self is y or isinstance(y, Subscripted) and \
                self.subscript == y.subscript and \
                super(Subscripted, self).__eq__(y)
 
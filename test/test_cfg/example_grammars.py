@@ -0,0 +1,19 @@
+'''Grammars shared by the tests of the GLR parsers and their parse forests.'''
+
+from cfg.core import ContextFreeGrammar
+from cfg.glr import enumerate_trees
+
+# An ambiguous grammar of sentences made of nouns, verbs, prepositional
+# phrases, and the conjunction a. The sentence nvnanvdnpdn has six parses.
+GRA = ContextFreeGrammar('''\
+S -> NV | SP | SaS
+N -> n | dn | NP | NaN
+V -> vN | vS
+P -> pN
+''')
+
+def tree_strings(roots):
+    '''List the trees of a forest, given as a list of root vertices, as
+    sorted strings, so that forests built in different ways can be
+    compared.'''
+    return sorted(str(t) for v in roots for t in enumerate_trees(v))
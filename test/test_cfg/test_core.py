@@ -1,6 +1,8 @@
 from cfg.core import *
 import unittest
 from pprint import pprint
+import pickle
+import copy
 
 class TestCFG(unittest.TestCase):
 
@@ -154,6 +156,50 @@ class TestCFG(unittest.TestCase):
         self.assertEqual(len(set(L)), len(L),
             'Markers are distinct items in lists')
 
+    def test_symbol_interning(self):
+
+        self.assertIs(Terminal('x'), Terminal('x'),
+            'Equal terminals are interned')
+        self.assertIs(Nonterminal('X'), Nonterminal('X'),
+            'Equal nonterminals are interned')
+        self.assertIs(SubscriptedNonterminal('X', 2), SubscriptedNonterminal('X', 2),
+            'Equal subscripted nonterminals are interned')
+        self.assertIsNot(Terminal('$'), Marker('$'),
+            'Symbols of different classes are not interned together')
+        self.assertNotEqual(SubscriptedNonterminal('X', 1), PrimedNonterminal('X', 1),
+            'Subscripted and primed nonterminals are still distinct')
+        self.assertFalse(hasattr(Terminal('x'), '__dict__'),
+            'Plain symbols have no instance dictionary')
+        self.assertIs(pickle.loads(pickle.dumps(PrimedNonterminal('X', 2))), PrimedNonterminal('X', 2),
+            'Unpickled symbols are interned')
+        self.assertIs(copy.deepcopy(Epsilon()), Epsilon(),
+            'Copying a symbol returns the symbol itself')
+        x, X2 = Terminal('x'), SubscriptedNonterminal('X', 2)
+        calls = []
+        key = Symbol.__dict__['__key__']
+        Symbol.__key__ = lambda self: calls.append(self) or key(self)
+        try:
+            self.assertIs(Terminal('x'), x)
+            self.assertIs(SubscriptedNonterminal('X', 2), X2)
+            self.assertEqual(calls, [],
+                'Interned symbols are not initialized again')
+            Terminal('not yet interned')
+            self.assertEqual(len(calls), 1,
+                'New symbols are initialized')
+        finally:
+            Symbol.__key__ = key
+        set_symbol_interning(False)
+        try:
+            a = Terminal('x')
+            self.assertIsNot(a, Terminal('x'),
+                'Symbols are not interned while interning is off')
+            self.assertEqual(a, Terminal('x'),
+                'Symbols are equal while interning is off')
+            self.assertEqual(hash(a), hash(Terminal('x')),
+                'Equal symbols have equal hash values while interning is off')
+        finally:
+            set_symbol_interning(True)
+
     def test_production_rule(self):
 
         self.assertEqual(
@@ -292,6 +338,24 @@ class TestCFG(unittest.TestCase):
             G1.productions_with_left_side(Nonterminal('S')),
             rules[0:2],
             'Get rules with S on left side')
+        self.assertEquals(G1.productions_with_left_side(Terminal('a')), [],
+            'Get no rules for a symbol which is not on any left side')
+        self.assertEquals(map(G1.production_index, rules), range(len(rules)),
+            'Get the positions of production rules')
+        with self.assertRaises(ValueError) as ar:
+            G1.production_index(ProductionRule(Nonterminal('F'), [Terminal('b')]))
+            # 'Production rule not in the grammar'
+
+        G3 = ContextFreeGrammar(rules[:]).freeze()
+        p = ProductionRule(Nonterminal('F'), [Terminal('b')])
+        G3.productions.append(p)
+        G3.invalidate()
+        self.assertIn(Terminal('b'), G3.terminals,
+            'Symbol sets are rebuilt after invalidation')
+        self.assertEquals(G3.productions_with_left_side(Nonterminal('F')), rules[4:6] + [p],
+            'Left side index is rebuilt after invalidation')
+        self.assertEquals(G3.production_index(p), len(rules),
+            'Production numbering is rebuilt after invalidation')
 
         with self.assertRaises(ValueError) as ar:
             ContextFreeGrammar([])
@@ -313,6 +377,22 @@ F -> (S) | a
         self.assertEquals(G2.symbols, set(nonterminals + terminals),
             'Symbols collected correctly')
 
+        self.assertEquals(G2.fingerprint(), G1.fingerprint(),
+            'Equal grammars have the same fingerprint')
+        self.assertNotEquals(G3.fingerprint(), G1.fingerprint(),
+            'Adding a rule changes the fingerprint')
+        self.assertNotEquals(
+            ContextFreeGrammar(nonterminals + [Nonterminal('X')], terminals, rules, start).fingerprint(),
+            G1.fingerprint(),
+            'Adding an unused symbol changes the fingerprint')
+        fingerprint = G2.fingerprint()
+        G2.productions.pop()
+        self.assertEquals(G2.fingerprint(), fingerprint,
+            'The fingerprint is kept until the grammar is invalidated')
+        G2.invalidate()
+        self.assertNotEquals(G2.fingerprint(), fingerprint,
+            'Modifying the rules changes the fingerprint')
+
         with self.assertRaises(ValueError) as ar:
             ContextFreeGrammar('')
             # 'Empty set of rules'
@@ -0,0 +1,71 @@
+from cfg.cyk import *
+from cfg.core import *
+from cfg.cnf import ChomskyNormalForm
+from cfg import aho_ullman, glr
+import unittest
+
+CFG = ContextFreeGrammar
+
+class TestCYK(unittest.TestCase):
+
+    def test_aho_ullman_example(self):
+        '''Show that the chart agrees with the parse table of Example 4.8 from
+        Aho & Ullman p. 315-316.'''
+        G = CFG('''
+S -> AA | AS | b
+A -> SA | AS | a
+''')
+        w = map(Terminal, 'abaab')
+        M = CYKGrammar(G)
+        chart = M.chart(w)
+        T = aho_ullman.cocke_younger_kasami_algorithm(G, w, check=False)
+        for i in xrange(len(w)):
+            for l in xrange(1, len(w) - i + 1):
+                self.assertEqual(
+                    set(A for A, x in zip(M.nonterminals, chart[i, l - 1]) if x),
+                    T[i + 1][l])
+        self.assertTrue(M.recognize(w))
+        tree = M.parse(w)
+        self.assertEqual(list(tree.iter_leaves()), w)
+        self.assertEqual((tree.start, tree.end), (0, 5))
+        self.assertFalse(recognize(G, map(Terminal, 'bb')))
+        with self.assertRaises(InputNotRecognized):
+            parse(G, map(Terminal, 'bb'))
+        with self.assertRaises(ValueError):
+            CYKGrammar(CFG('S -> aSb |'))
+
+    def test_chomsky_normal_form(self):
+        '''Show that grammars converted to CNF are accepted directly and
+        recognize the same strings as the GLR parser.'''
+        G = CFG('''
+E -> E+T | T
+T -> T*F | F
+F -> (E) | a
+''')
+        M = CYKGrammar(ChomskyNormalForm(G))
+        for s in ['a', 'a+a', 'a*(a+a)', '(a)*a+a', '', '+', 'a+', '(a']:
+            w = map(Terminal, s)
+            expected = glr.recognize(glr.get_table(G), w)[0]
+            self.assertEqual(M.recognize(w), expected, s)
+            if expected:
+                self.assertEqual(list(M.parse(w).iter_leaves()), w)
+        M = CYKGrammar(ChomskyNormalForm(CFG('S -> aSb |')))
+        for n in xrange(1, 4):
+            self.assertTrue(M.recognize(map(Terminal, 'a' * n + 'b' * n)))
+        self.assertFalse(M.recognize(map(Terminal, 'aab')))
+        M = CYKGrammar(CFG('S -> AB |\nA -> a\nB -> b'))
+        self.assertTrue(M.recognize([]))
+        self.assertEqual(M.parse([]).subtrees, ())
+        self.assertTrue(M.recognize(map(Terminal, 'ab')))
+
+    def test_long_input(self):
+        '''Show that trees of long inputs are built without recursion.'''
+        M = CYKGrammar(CFG('S -> AS | a\nA -> a'))
+        w = map(Terminal, 'a' * 1200)
+        self.assertTrue(M.recognize(w))
+        tree = M.parse(w)
+        self.assertEqual((tree.start, tree.end), (0, 1200))
+        self.assertEqual(tree.subtrees[1].start, 1)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,303 @@
+from cfg.glr import *
+from cfg import glr
+from cfg.core import *
+from cfg.table import build_slr_table
+import sys
+import unittest
+from test_table import grammar_test_cases
+from example_grammars import GRA
+
+class TestGLR(unittest.TestCase):
+
+    def test_parse(self):
+        '''Show that all of the parses of an ambiguous sentence are found with
+        SLR and LALR tables, and that invalid input is rejected.'''
+        trees = list(parse(GRA, map(Terminal, 'nvnanvdnpdn')))
+        self.assertEqual(len(trees), 6, 'the sentence has six parses')
+        self.assertEqual(len(set(trees)), 6, 'a parse is repeated')
+        for t in trees:
+            self.assertEqual(''.join(a.name for a in t.iter_leaves()), 'nvnanvdnpdn')
+        lalr_trees = list(parse(GRA, map(Terminal, 'nvnanvdnpdn'), 'lalr'))
+        self.assertEqual(set(lalr_trees), set(trees),
+                         'LALR and SLR tables give the same parses')
+        with self.assertRaises(InputNotRecognized):
+            list(parse(GRA, map(Terminal, 'nv')))
+        with self.assertRaises(InputNotRecognized):
+            list(parse(GRA, map(Terminal, 'nvx')))
+
+    def test_empty_rules(self):
+        '''Show that grammars with empty rules are parsed correctly.'''
+        G3 = [test.grammar for test in grammar_test_cases if test.filename.endswith('G3.txt')][0]
+        trees = list(parse(G3, map(Terminal, 'xbb')))
+        self.assertEqual(len(trees), 1)
+        self.assertEqual(str(trees[0]), 'S(AS(AS(x)b)b)')
+
+    def test_ambiguous_links(self):
+        '''Show that every binary bracketing of a string is found exactly
+        once, so that the numbers of trees are the Catalan numbers.'''
+        G = ContextFreeGrammar('S -> SS | a')
+        catalan = [1, 1, 2, 5, 14, 42, 132]
+        for n in xrange(1, 8):
+            trees = list(parse(G, map(Terminal, 'a' * n)))
+            self.assertEqual(len(set(trees)), catalan[n - 1])
+            self.assertEqual(len(trees), catalan[n - 1],
+                             'a tree is enumerated more than once')
+
+    def test_enumerate_trees(self):
+        '''Show that enumerate_trees stops at its limit without building the
+        other trees and terminates on cyclic forests.'''
+        G = ContextFreeGrammar('S -> SS | a')
+        v, = glr_parse(build_slr_table(G), map(Terminal, 'a' * 40))
+        trees = list(enumerate_trees(v, limit=3))
+        self.assertEqual(len(trees), 3, 'the limit is not respected')
+        self.assertEqual(len(set(trees)), 3)
+        self.assertEqual(list(enumerate_trees(v, limit=0)), [])
+        G = ContextFreeGrammar('''\
+S -> A | b
+A -> S | a
+''')
+        v, = glr_parse(build_slr_table(G), map(Terminal, 'a'))
+        self.assertEqual(map(str, enumerate_trees(v)), ['S(A(a))'],
+                         'only trees which do not repeat a cycle are enumerated')
+        G = ContextFreeGrammar('S -> SS | a |')
+        v, = glr_parse(build_slr_table(G), map(Terminal, 'aa'))
+        trees = list(enumerate_trees(v))
+        self.assertIn('S(S(a)S(a))', map(str, trees))
+        self.assertEqual(len(set(trees)), len(trees))
+
+    def test_best_trees(self):
+        '''Show that best_trees finds the same scores as scoring every tree,
+        in acyclic and cyclic forests.'''
+        weights = { str(p) : (i * 7) % 5 for i, p in enumerate(GRA.productions) }
+        score = lambda rule: weights[str(rule)]
+        v, = glr_parse(build_slr_table(GRA), map(Terminal, 'nvnanvdnpdn'))
+        best = best_trees(v, 4, score)
+        self.assertEqual(len(best), 4)
+        all_trees = sorted((glr._tree_score(t, score) for t in enumerate_trees(v)), reverse=True)
+        self.assertEqual([s for s, t in best], all_trees[:4],
+                         'best_trees does not agree with scoring every tree')
+        for s, t in best:
+            self.assertEqual(glr._tree_score(t, score), s)
+        self.assertEqual(len(best_trees(v, 100, score)), 6,
+                         'a forest of six trees gives at most six best trees')
+        G = ContextFreeGrammar('''\
+S -> A | b
+A -> S | a
+''')
+        v, = glr_parse(build_slr_table(G), map(Terminal, 'a'))
+        self.assertEqual([(s, str(t)) for s, t in best_trees(v, 2, lambda r: -1)],
+                         [(-2, 'S(A(a))'), (-4, 'S(A(S(A(a))))')],
+                         'the second best tree goes around the cycle once')
+        with self.assertRaises(ValueError):
+            best_trees(v, 1, lambda r: 1)
+        G = ContextFreeGrammar('S -> SS | a |')
+        weights = { 'S -> SS' : -3, 'S -> a' : -1, 'S -> ' : -2 }
+        score = lambda rule: weights[str(rule)]
+        v, = glr_parse(build_slr_table(G), map(Terminal, 'aaa'))
+        [(s, t)] = best_trees(v, 1, score)
+        self.assertEqual(s, max(glr._tree_score(t, score) for t in enumerate_trees(v)),
+                         'the best tree of a cyclic forest does not repeat a cycle')
+        self.assertEqual(glr._tree_score(t, score), s)
+
+    def test_count_trees(self):
+        '''Show that count_trees counts the trees of a forest exactly without
+        building them, and that a cyclic forest has infinitely many.'''
+        v, = glr_parse(build_slr_table(GRA), map(Terminal, 'nvnanvdnpdn'))
+        self.assertEqual(count_trees(v), 6)
+        G = ContextFreeGrammar('S -> SS | a')
+        table = build_slr_table(G)
+        catalan = 1
+        for n in xrange(1, 30):
+            v, = glr_parse(table, map(Terminal, 'a' * n))
+            self.assertEqual(count_trees(v), catalan,
+                             'the number of bracketings is a Catalan number')
+            catalan = catalan * 2 * (2 * n - 1) // (n + 1)
+        self.assertEqual(count_trees(v), 263747951750360)
+        G = ContextFreeGrammar('''\
+S -> A | b
+A -> S | a
+''')
+        v, = glr_parse(build_slr_table(G), map(Terminal, 'a'))
+        self.assertEqual(count_trees(v), float('inf'),
+                         'a cyclic forest encodes infinitely many trees')
+
+    def test_long_rule(self):
+        '''Show that rules longer than the recursion limit are reduced.'''
+        n = sys.getrecursionlimit() + 100
+        G = ContextFreeGrammar('S -> %s | SS' % ('a' * n))
+        roots = glr_parse(build_slr_table(G), map(Terminal, 'a' * n))
+        self.assertEqual(len(roots), 1)
+        self.assertEqual([len(c) for c in roots[0].children], [n],
+                         'the long rule is not reduced')
+
+    def test_spans(self):
+        '''Show that vertices are shared by symbol and span, and that
+        vertices and trees record the spans of input which they cover.'''
+        v, = glr_parse(build_slr_table(GRA), map(Terminal, 'nvnanvdnpdn'))
+        self.assertEqual((v.start, v.end), (0, 11), 'the root spans the input')
+        spans = {}
+        stack = [v]
+        while stack:
+            u = stack.pop()
+            key = (u.symbol, u.start, u.end)
+            if key not in spans:
+                spans[key] = u
+                for alt in u.children:
+                    self.assertEqual([c.start for c in alt[1:]], [c.end for c in alt[:-1]],
+                                     'the children of a vertex are not adjacent')
+                    self.assertEqual((alt[0].start, alt[-1].end), (u.start, u.end))
+                    self.assertEqual(len(set(map(id, alt))), len(alt))
+                    stack.extend(alt)
+            else:
+                self.assertIs(spans[key], u,
+                              'two vertices have the same symbol and span')
+            self.assertEqual(len(set(tuple(map(id, alt)) for alt in u.children)),
+                             len(u.children))
+        for t in enumerate_trees(v):
+            self.assertEqual((t.start, t.end), (0, 11))
+            leaves = []
+            stack = [t]
+            while stack:
+                s = stack.pop()
+                if s.subtrees:
+                    self.assertEqual((s.subtrees[0].start, s.subtrees[-1].end), (s.start, s.end))
+                    stack.extend(reversed(s.subtrees))
+                else:
+                    leaves.append((s.start, s.end))
+            self.assertEqual(leaves, [(i, i + 1) for i in xrange(11)],
+                             'each leaf spans one token')
+        tree = ParseTree(Nonterminal('S'), [ParseTree(Terminal('a'))])
+        self.assertEqual((tree.start, tree.end), (None, None))
+        self.assertEqual(tree, ParseTree(Nonterminal('S'), [ParseTree(Terminal('a'), None, 0, 1)], 0, 1))
+
+    def test_session(self):
+        '''Show that a GLRSession can be fed tokens one at a time, and that
+        its snapshots can be restored to continue from an earlier point.'''
+        table = build_slr_table(GRA)
+        session = GLRSession(table)
+        self.assertIs(session.table, table.compile())
+        for a in 'nvnanv':
+            session.feed(Terminal(a))
+        self.assertTrue(session.viable)
+        self.assertEqual(session.level, 6)
+        snapshot = session.snapshot()
+        for a in 'dnpdn':
+            session.feed(Terminal(a))
+        trees = [str(t) for v in session.finish() for t in enumerate_trees(v)]
+        self.assertEqual(sorted(trees),
+                         sorted(str(t) for t in parse(GRA, map(Terminal, 'nvnanvdnpdn'))),
+                         'a session gives the same trees as parse')
+        with self.assertRaises(ValueError):
+            session.feed(Terminal('n'))
+        session.restore(snapshot)
+        self.assertEqual(session.level, 6, 'the snapshot is not restored')
+        with self.assertRaises(InputNotRecognized):
+            session.feed(Terminal('v'))
+        self.assertFalse(session.viable)
+        with self.assertRaises(InputNotRecognized):
+            session.feed(Terminal('n'))
+        session.restore(snapshot)
+        session.feed(Terminal('n'))
+        self.assertEqual([str(t) for v in session.finish() for t in enumerate_trees(v)],
+                         [str(t) for t in parse(GRA, map(Terminal, 'nvnanvn'))])
+        session.restore(snapshot)
+        with self.assertRaises(InputNotRecognized):
+            session.finish()
+        session = GLRSession(table)
+        with self.assertRaises(InputNotRecognized):
+            session.feed(Terminal('x'))
+        self.assertFalse(session.viable)
+
+    def test_recognize(self):
+        '''Show that recognize accepts the same strings as the parser and
+        gives the position of the first token which cannot be read.'''
+        table = build_slr_table(GRA)
+        self.assertEqual(recognize(table, map(Terminal, 'nvnanvdnpdn')), (True, None))
+        self.assertEqual(recognize(table, map(Terminal, 'nv')), (False, 2),
+                         'input which ends too early fails at its end')
+        self.assertEqual(recognize(table, map(Terminal, 'nvvn')), (False, 2),
+                         'the first token which cannot be read is reported')
+        self.assertEqual(recognize(table, map(Terminal, 'nvnx')), (False, 3))
+        self.assertEqual(recognize(table, []), (False, 0))
+        G3 = [test.grammar for test in grammar_test_cases if test.filename.endswith('G3.txt')][0]
+        self.assertEqual(recognize(build_slr_table(G3), map(Terminal, 'xbb')), (True, None))
+        G = ContextFreeGrammar('S -> SS | a |')
+        table = build_slr_table(G)
+        for n in xrange(4):
+            self.assertEqual(recognize(table, map(Terminal, 'a' * n)), (True, None))
+        self.assertEqual(recognize(table, map(Terminal, 'aba')), (False, 1))
+
+    def test_parse_many(self):
+        '''Show that parse_many gives the same trees as parse, in the order of
+        the inputs or tagged with their indexes.'''
+        inputs = ['nvnanvdnpdn', 'nv', 'nvdn', 'nvx', 'nvnanvdnpdn', ''] * 3
+        expected = []
+        for s in inputs:
+            try:
+                expected.append(sorted(map(str, parse(GRA, map(Terminal, s)))))
+            except InputNotRecognized:
+                expected.append([])
+        results = parse_many(GRA, (map(Terminal, s) for s in inputs),
+                             workers=2, chunksize=4)
+        self.assertEqual([sorted(map(str, trees)) for trees in results], expected,
+                         'parse_many does not agree with parse')
+        results = parse_many(GRA, (map(Terminal, s) for s in inputs),
+                             workers=2, ordered=False)
+        self.assertEqual(sorted((i, sorted(map(str, trees))) for i, trees in results),
+                         list(enumerate(expected)))
+
+    def test_compiled_table(self):
+        '''Show that a table is compiled once into an equivalent table.'''
+        for test in grammar_test_cases:
+            table = build_slr_table(test.grammar)
+            compiled = table.compile()
+            self.assertIs(table.compile(), compiled)
+            self.assertTrue(compiled.equivalent(table), test.filename)
+
+    def test_glr_parse_ids(self):
+        '''Show that the input may be given as terminal numbers.'''
+        table = build_slr_table(GRA).compile()
+        ids = [table.terminal_id(Terminal(c)) for c in 'nvdn']
+        roots = glr_parse_ids(table, ids)
+        self.assertEqual([str(t) for v in roots for t in enumerate_trees(v)],
+                         ['S(N(n)V(vN(dn)))'])
+        with self.assertRaises(InputNotRecognized):
+            glr_parse_ids(table, ids[:1])
+
+    def test_parser(self):
+        '''Show that a Parser gives the same trees as parse.'''
+        parser = Parser(GRA, 'lalr')
+        self.assertIs(parser.grammar, GRA)
+        self.assertEqual(set(parser.parse(map(Terminal, 'nvnanvdnpdn'))),
+                         set(parse(GRA, map(Terminal, 'nvnanvdnpdn'))),
+                         'a Parser does not agree with parse')
+        self.assertEqual(len(parser.parse_forest(map(Terminal, 'nvdn'))), 1)
+        with self.assertRaises(InputNotRecognized):
+            list(parser.parse(map(Terminal, 'nv')))
+
+    def test_table_cache(self):
+        '''Show that tables are cached under the fingerprints of their
+        grammars, rebuilt when a grammar changes, and evicted when the cache
+        is full.'''
+        table_cache.clear()
+        G = ContextFreeGrammar(list(GRA.productions))
+        table = get_table(G)
+        self.assertIs(get_table(GRA), table,
+                      'equal grammars do not share a cached table')
+        self.assertIsNot(get_table(G, 'lalr'), table)
+        self.assertEqual((table_cache.hits, table_cache.misses), (1, 2))
+        list(parse(G, map(Terminal, 'nvdn')))
+        self.assertEqual(table_cache.hits, 2)
+        G.productions.append(ProductionRule(Nonterminal('P'), [Terminal('q')]))
+        G.invalidate()
+        self.assertIsNot(get_table(G), table,
+                         'a table is reused after its grammar changed')
+        self.assertTrue(list(parse(G, map(Terminal, 'nvnq'))))
+        self.assertEqual(table_cache.misses, 3)
+        table_cache.maxsize = 1
+        self.assertEqual(len(table_cache), 1)
+        self.assertNotIn((GRA.fingerprint(), 'slr'), table_cache)
+        table_cache.maxsize = 32
+
+if __name__ == '__main__':
+    unittest.main()
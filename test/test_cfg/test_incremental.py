@@ -0,0 +1,93 @@
+from cfg.incremental import *
+from cfg.core import *
+from cfg.glr import GLRSession, glr_parse, count_trees
+from cfg.table import build_slr_table
+import unittest
+from example_grammars import GRA, tree_strings
+
+class TestIncremental(unittest.TestCase):
+
+    def test_edit(self):
+        '''Show that after each edit the incremental parser gives the same
+        forest as parsing the edited input from scratch, reusing at least
+        the tokens before the change.'''
+        table = build_slr_table(GRA)
+        parser = IncrementalParser(table, map(Terminal, 'nvnanvdnpdn'))
+        self.assertEqual(parser.error_position, None)
+        self.assertEqual(len(list(parser.trees())), 6)
+        edits = [
+            (9, 11, 'n'),
+            (2, 2, 'dn'),
+            (4, 5, ''),
+            (11, 11, 'p'),
+            (3, 3, 'a'),
+            (12, 13, ''),
+            (0, 12, 'nvn')
+        ]
+        tokens = map(Terminal, 'nvnanvdnpdn')
+        for start, end, new in edits:
+            error = parser.error_position
+            tokens[start:end] = map(Terminal, new)
+            parser.edit(start, end, map(Terminal, new))
+            self.assertEqual(parser.tokens, tuple(tokens))
+            self.assertGreaterEqual(parser.reused,
+                                    start if error is None else min(start, error),
+                                    'the tokens before the edit are read again')
+            try:
+                expected = tree_strings(glr_parse(table, tokens))
+            except InputNotRecognized:
+                self.assertIsNotNone(parser.error_position)
+                with self.assertRaises(InputNotRecognized):
+                    parser.forest()
+            else:
+                self.assertIsNone(parser.error_position)
+                self.assertEqual(tree_strings(parser.forest()), expected,
+                                 'the edited forest differs from a fresh parse')
+
+    def test_right_context(self):
+        '''Show that the tokens after an edit are not read again once the
+        parse is back in step with the old one.'''
+        table = build_slr_table(GRA)
+        tokens = map(Terminal, 'nvn' + 'anvn' * 20)
+        parser = IncrementalParser(table, tokens)
+        fed = []
+        feed = GLRSession.__dict__['feed']
+        GLRSession.feed = lambda self, a: fed.append(a) or feed(self, a)
+        try:
+            for start, end, new in [(10, 11, 'dn'), (10, 12, 'n'), (41, 41, 'pn'),
+                                    (50, 51, 'n')]:
+                del fed[:]
+                tokens[start:end] = map(Terminal, new)
+                parser.edit(start, end, map(Terminal, new))
+                self.assertLessEqual(len(fed), len(new) + 2,
+                                     'the right context of the edit is read again')
+                self.assertEqual(parser.reused, len(tokens) - len(fed))
+                self.assertIsNone(parser.error_position)
+        finally:
+            GLRSession.feed = feed
+        root, = parser.forest()
+        expected, = glr_parse(table, tokens)
+        self.assertEqual(count_trees(root), count_trees(expected),
+                         'the spliced forest differs from a fresh parse')
+        self.assertEqual((root.start, root.end), (0, len(tokens)))
+
+    def test_edit_after_error(self):
+        '''Show that the position of a syntax error is kept up to date, and
+        that input after an error is not reused.'''
+        parser = IncrementalParser(build_slr_table(GRA), map(Terminal, 'nvvnan'))
+        self.assertEqual(parser.error_position, 2)
+        parser.edit(5, 6, [])
+        self.assertEqual(parser.reused, 2,
+                         'only the tokens before the error are reused')
+        self.assertEqual(parser.error_position, 2)
+        parser.edit(2, 3, [])
+        self.assertEqual(parser.error_position, 4)
+        parser.edit(4, 4, map(Terminal, 'n'))
+        self.assertEqual(parser.reused, 4)
+        self.assertEqual(parser.error_position, None)
+        self.assertEqual(map(str, parser.trees()), ['S(N(n)V(vN(N(n)aN(n))))'])
+        with self.assertRaises(IndexError):
+            parser.edit(3, 2, [])
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,178 @@
+from cfg.rnglr import *
+from cfg.core import *
+from cfg.glr import glr_parse, count_trees, best_trees
+from cfg.table import build_table, build_rn_table
+import os
+import shutil
+import tempfile
+import unittest
+from test_table import grammar_test_cases
+from example_grammars import GRA, tree_strings
+
+class TestRNGLR(unittest.TestCase):
+
+    def test_parse(self):
+        '''Show that RNGLR and BRNGLR find all of the parses of an ambiguous
+        sentence and reject invalid input.'''
+        w = map(Terminal, 'nvnanvdnpdn')
+        trees = sorted(map(str, parse(GRA, w)))
+        self.assertEqual(len(trees), 6, 'the sentence has six parses')
+        self.assertEqual(sorted(map(str, parse(GRA, w, binarised=True))), trees,
+                         'BRNGLR gives different parses')
+        self.assertEqual(sorted(map(str, parse(GRA, w, 'lalr'))), trees)
+        for binarised in (False, True):
+            with self.assertRaises(InputNotRecognized):
+                list(parse(GRA, map(Terminal, 'nv'), binarised=binarised))
+            with self.assertRaises(InputNotRecognized):
+                list(parse(GRA, map(Terminal, 'nvx'), binarised=binarised))
+
+    def test_same_forest_as_glr(self):
+        '''Show that RNGLR and BRNGLR encode the same trees as the GLR parser
+        on a grammar with many empty rules.'''
+        G = ContextFreeGrammar('''\
+S -> aSAAB | cS | b
+A -> c | BD |
+B -> d |
+D -> e |
+''')
+        for kind in ('slr', 'lalr'):
+            table = build_table(G, kind)
+            for w in ('b', 'ab', 'abcd', 'aabdde', 'cab', 'aabcdcde'):
+                w = map(Terminal, w)
+                trees = tree_strings(glr_parse(table, w))
+                self.assertEqual(tree_strings(rnglr_parse(table, w)), trees,
+                                 'RNGLR does not agree with GLR')
+                self.assertEqual(tree_strings(brnglr_parse(table, w)), trees,
+                                 'BRNGLR does not agree with GLR')
+
+    def test_empty_rules(self):
+        '''Show that empty rules are reduced, including on empty input.'''
+        G3 = [test.grammar for test in grammar_test_cases if test.filename.endswith('G3.txt')][0]
+        for binarised in (False, True):
+            trees = list(parse(G3, map(Terminal, 'xbb'), binarised=binarised))
+            self.assertEqual(map(str, trees), ['S(AS(AS(x)b)b)'])
+        G = ContextFreeGrammar('''\
+S -> AB
+A -> a |
+B -> b |
+''')
+        self.assertEqual(map(str, parse(G, [])), ['S(AB)'],
+                         'empty input is derived with the epsilon forest')
+
+    def test_repeated_empty_rules(self):
+        '''Show that a rule which occurs twice gives no repeated trees.'''
+        G = ContextFreeGrammar('''\
+S -> | | B | aSB
+B -> |
+''')
+        table = build_table(G)
+        for w in ('', 'a', 'aa'):
+            w = map(Terminal, w)
+            trees = tree_strings(glr_parse(table, w))
+            self.assertEqual(tree_strings(rnglr_parse(table, w)), trees,
+                             'repeated empty rules give repeated trees')
+            self.assertEqual(tree_strings(brnglr_parse(table, w)), trees,
+                             'repeated empty rules give repeated trees')
+
+    def test_binarised_forest_size(self):
+        '''Show that the forest of BRNGLR encodes the same trees as that of
+        RNGLR in a size at most cubic in the length of the input.'''
+        G = ContextFreeGrammar('''\
+S -> SSSSS | SS | a
+''')
+        table = build_rn_table(G)
+        w = map(Terminal, 'a' * 12)
+        root, = brnglr_parse(table, w)
+        expanded, = rnglr_parse(table, w)
+        self.assertEqual(count_trees(root), count_trees(expanded),
+                         'the binarised forest encodes different trees')
+        score = lambda rule: -len(rule.right_side)
+        self.assertEqual([x for x, t in best_trees(root, 3, score)],
+                         [x for x, t in best_trees(expanded, 3, score)])
+        # The intermediate vertices stay in the forest, so its size is at
+        # most cubic in the length of the input.
+        n = 40
+        root, = brnglr_parse(table, map(Terminal, 'a' * n))
+        self.assertLessEqual(len(root.children), 2 * n)
+        seen = set([root])
+        stack = [root]
+        size = 0
+        while stack:
+            for alt in stack.pop().children:
+                size += len(alt)
+                for c in alt:
+                    if c not in seen:
+                        seen.add(c)
+                        stack.append(c)
+        self.assertLess(size, 2 * n ** 3, 'the binarised forest is not cubic')
+        t = next(enumerate_trees(root))
+        self.assertEqual((t.start, t.end), (0, n))
+
+    def test_intermediate_spans(self):
+        '''Show that the intermediate vertices of BRNGLR record the spans of
+        the sequences which they stand for.'''
+        G = ContextFreeGrammar('''\
+S -> aSAAB | cS | b
+A -> c | BD |
+B -> d |
+D -> e |
+''')
+        root, = brnglr_parse(build_table(G), map(Terminal, 'aabcdcde'))
+        seen = set([root])
+        stack = [root]
+        intermediates = 0
+        while stack:
+            u = stack.pop()
+            for alt in u.children:
+                # The children which have spans, leaving out the epsilon
+                # vertices, cover the span of their parent in order.
+                spans = [(c.start, c.end) for c in alt if c.start is not None]
+                if u.intermediate:
+                    self.assertIsNotNone(u.start,
+                                         'an intermediate vertex has no span')
+                    position = u.start
+                    for start, end in spans:
+                        self.assertEqual(start, position)
+                        position = end
+                    self.assertEqual(position, u.end)
+                for c in alt:
+                    if c not in seen:
+                        seen.add(c)
+                        stack.append(c)
+            intermediates += u.intermediate
+        self.assertGreater(intermediates, 0)
+
+    def test_rn_table(self):
+        '''Show that an RN table has the right-nulled reductions of its
+        grammar, and that it survives a round trip through a file.'''
+        G = ContextFreeGrammar('''\
+S -> aAB
+A -> c |
+B -> b |
+''')
+        table = build_rn_table(G)
+        a, end = table.terminal_id(Terminal('a')), table.end_marker_id
+        q = table.get_shift(0, a)
+        self.assertIn((0, 1), table.get_rn_reductions(q, end),
+                      'a rule is reduced when the rest of it is nullable')
+        self.assertIn((2, 0), table.get_rn_reductions(q, end))
+        self.assertNotIn((0, 1), table.get_rn_reductions(q, a))
+        self.assertTrue(table.is_nullable(table.nonterminal_id(Nonterminal('A'))))
+        self.assertFalse(table.is_nullable(table.nonterminal_id(Nonterminal('S'))))
+        self.assertTrue(table.equivalent(build_table(G)))
+        cache_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(cache_dir, 'table')
+            table.save(path)
+            loaded = RNParseTable.load(path)
+            self.assertEqual(loaded.get_rn_reductions(q, end),
+                             table.get_rn_reductions(q, end),
+                             'the loaded table has different reductions')
+            build_table(G).compile().save(path)
+            with self.assertRaises(ValueError):
+                RNParseTable.load(path)
+        finally:
+            shutil.rmtree(cache_dir)
+
+if __name__ == '__main__':
+    unittest.main()
@@ -28,11 +28,50 @@ class TestSLR(unittest.TestCase):
         self.assertEqual(len(set([Item(p, 0), Item(p, 1), Item(p, 0)])), 2)
         self.assertEqual(len(set([Item(p, 0), Item(p2, 0), Item(p, 2)])), 3)
 
+    def test_automaton(self):
+        G = ContextFreeGrammar('''\
+E -> E+T | T
+T -> T*F | F
+F -> (E) | a
+''')
+        M = Automaton(G)
+        self.assertEqual(M.num_states(), 12)
+        self.assertEqual(M.next_state(0, Nonterminal('E')), 1)
+        for i, X, j in M.transitions:
+            I = M.get_state(i)
+            self.assertEqual(I.goto(X), M.get_state(j))
+            self.assertEqual(M._get_state_index(I.goto(X)), j)
+        kernels = [I.kernel() for i, I in M.closure_states()]
+        self.assertEqual(len(set(kernels)), len(kernels))
+
     def test_table(self):
         for test in filter(lambda x: x.table is not None, grammar_test_cases):
             actual_table = ParsingTable(test.grammar).to_normal_form()
             self.assertTrue(actual_table.equivalent(test.table))
 
+    def test_first_and_follow_sets(self):
+        G = ContextFreeGrammar('''\
+A -> ADx | BC
+B -> AC | BB |
+C -> y |
+D -> z
+''')
+        first = FirstSetTable(G)
+        self.assertEqual(first.terminals(Nonterminal('B')), set(map(Terminal, 'yz')))
+        self.assertTrue(first.nullable(Nonterminal('A')))
+        self.assertFalse(first.nullable(Nonterminal('D')))
+        self.assertEqual(first.string_first([Nonterminal('C'), Terminal('x')]),
+                         (set(map(Terminal, 'xy')), False))
+        p = G.productions[0]
+        self.assertEqual(first.suffix_first(p, 1), (set([Terminal('z')]), False))
+        self.assertEqual(first.suffix_first(p, 3), (set(), True))
+        follow = FollowSetTable(first, Automaton(G))
+        self.assertEqual(follow.terminals(Nonterminal('A')),
+                         set(map(Terminal, 'yz')) | set([END_MARKER]))
+        self.assertEqual(follow.terminals(Nonterminal('D')), set([Terminal('x')]))
+        self.assertEqual(follow.terminals(Nonterminal('C')),
+                         set(map(Terminal, 'yz')) | set([END_MARKER]))
+
 if __name__ == '__main__':
     unittest.main()
 
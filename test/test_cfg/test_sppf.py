@@ -0,0 +1,91 @@
+from cfg.sppf import *
+from cfg.core import *
+from cfg.glr import glr_parse, count_trees
+from cfg.rnglr import rnglr_parse
+from cfg.table import build_slr_table
+import sys
+import unittest
+from example_grammars import GRA, tree_strings
+
+class TestSPPF(unittest.TestCase):
+
+    def test_compact_forest(self):
+        '''Show that a CompactForest encodes the same trees as the forest it
+        is built from, and that its nodes can be looked up by span.'''
+        w = map(Terminal, 'nvnanvdnpdn')
+        roots = glr_parse(build_slr_table(GRA), w)
+        forest = CompactForest(roots)
+        self.assertEqual(sorted(map(str, forest.trees())), tree_strings(roots),
+                         'the compact forest encodes different trees')
+        self.assertEqual(len(list(forest.trees(limit=2))), 2)
+        root, = forest.roots
+        self.assertEqual((root.symbol, root.start, root.end), (Nonterminal('S'), 0, 11))
+        self.assertEqual(count_trees(root), 6)
+        # Every token is represented by a single leaf.
+        leaves = [i for i in xrange(forest.num_nodes()) if not forest.node_alternatives(i)]
+        self.assertEqual(len(leaves), len(w), 'a token has more than one leaf')
+        self.assertEqual(sorted(forest.node_span(i) for i in leaves),
+                         [(i, i + 1) for i in xrange(len(w))])
+        N = forest.find(Nonterminal('N'), 6, 8)
+        self.assertEqual(N.symbol, Nonterminal('N'))
+        self.assertEqual([[c.symbol for c in alt] for alt in N.children],
+                         [map(Terminal, 'dn')])
+        self.assertEqual(forest.node(N.index), N)
+        self.assertIn(N, set(forest.node(i) for i in xrange(forest.num_nodes())))
+        self.assertIsNone(forest.find(Nonterminal('N'), 6, 7),
+                          'find returns a node of the wrong span')
+        self.assertIsNone(forest.find(Nonterminal('X'), 0, 1))
+
+    def test_shared_nodes(self):
+        '''Show that there is one node for each symbol and span.'''
+        G = ContextFreeGrammar('S -> SS | a')
+        w = map(Terminal, 'a' * 8)
+        roots = glr_parse(build_slr_table(G), w)
+        forest = CompactForest(roots)
+        self.assertEqual(forest.num_nodes(), 8 + 8 * 9 // 2,
+                         'the nodes of a symbol and span are not merged')
+        self.assertEqual(count_trees(forest.roots[0]), count_trees(roots[0]))
+
+    def test_memory(self):
+        '''Show that a CompactForest takes much less memory than the Vertex
+        objects it is built from.'''
+        G = ContextFreeGrammar('S -> SS | a')
+        roots = glr_parse(build_slr_table(G), map(Terminal, 'a' * 40))
+        forest = CompactForest(roots)
+        # Neither size counts the symbols, which both forests share.
+        vertex_bytes = 0
+        seen = set(roots)
+        stack = list(roots)
+        while stack:
+            v = stack.pop()
+            vertex_bytes += sys.getsizeof(v) + sys.getsizeof(v.__dict__) + \
+                sys.getsizeof(v.children)
+            for alt in v.children:
+                vertex_bytes += sys.getsizeof(alt)
+                for c in alt:
+                    if c not in seen:
+                        seen.add(c)
+                        stack.append(c)
+        compact_bytes = sum(sys.getsizeof(x) for x in vars(forest).itervalues())
+        self.assertLess(compact_bytes * 4, vertex_bytes,
+                        'the compact forest is not much smaller')
+
+    def test_epsilon_forest(self):
+        '''Show that the forests of RNGLR, whose epsilon vertices have no
+        span, are compacted into forests which encode the same trees.'''
+        G = ContextFreeGrammar('''\
+S -> AbA
+A -> a |
+''')
+        table = build_slr_table(G)
+        for w in ('b', 'ab', 'aba'):
+            roots = rnglr_parse(table, map(Terminal, w))
+            forest = CompactForest(roots)
+            self.assertEqual(sorted(map(str, forest.trees())), tree_strings(roots),
+                             'the compact forest encodes different trees')
+        root, = forest.roots
+        self.assertEqual([[(c.symbol, c.start, c.end) for c in alt] for alt in root.children],
+                         [[(Nonterminal('A'), 0, 1), (Terminal('b'), 1, 2), (Nonterminal('A'), 2, 3)]])
+
+if __name__ == '__main__':
+    unittest.main()
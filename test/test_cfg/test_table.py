@@ -1,6 +1,11 @@
 from cfg.table import *
 from read_grammar import *
 from glob import glob
+import cPickle as pickle
+import os
+import shutil
+import struct
+import tempfile
 import unittest
 
 def get_test_cases(folder):
@@ -20,6 +25,36 @@ class TestTable(unittest.TestCase):
         for test in table_test_cases:
             self.assertEqual(test.tablea.equivalent(test.tableb), test.result, str(test))
 
+    def test_first_and_follow_sets(self):
+        '''Show that the first and follow sets are computed correctly, and
+        that their bitsets are available.'''
+        G = CFG('''\
+A -> ADx | BC
+B -> AC | BB |
+C -> y |
+D -> z
+''')
+        A, B, C, D = map(Nonterminal, 'ABCD')
+        x, y, z = map(Terminal, 'xyz')
+        first, nullable = first_sets(G)
+        self.assertEqual(dict(first), {
+            A : set([y, z]), B : set([y, z]), C : set([y]), D : set([z])})
+        self.assertEqual(nullable, set([A, B, C]))
+        follow = follow_sets(G, first, nullable)
+        self.assertEqual(dict(follow), {
+            A : set([y, z, END_MARKER]), B : set([y, z, END_MARKER]),
+            C : set([y, z, END_MARKER]), D : set([x])})
+        self.assertEqual(follow.index.decode(follow.bits(D)), set([x]))
+        self.assertEqual(follow_sets(G, dict(first), nullable), follow)
+        suffixes = suffix_first_sets(G, first, nullable)
+        p = G.productions[0]
+        self.assertEqual(suffixes[p, 0], (set([y, z]), False))
+        self.assertEqual(suffixes[p, 1], (set([z]), False))
+        self.assertEqual(suffixes[p, 2], (set([x]), False))
+        self.assertEqual(suffixes[p, 3], (set(), True))
+        self.assertEqual(suffixes[G.productions[1], 0], (set([y, z]), True))
+        self.assertEqual(suffix_first_sets(G, dict(first), nullable), suffixes)
+
     def test_build_slr_table(self):
         '''Show that the SLR table is computed correctly for several test
         grammars, using the SLR table equivalency algorithm.'''
@@ -29,6 +64,121 @@ class TestTable(unittest.TestCase):
                 actual_table = build_slr_table(test.grammar).to_normal_form()
                 self.assertTrue(actual_table.equivalent(expected_table))
 
+    def test_build_lalr_table(self):
+        '''Show that the LALR table has the same states and shifts as the SLR
+        table, that its reductions are a subset of the SLR reductions, and
+        that it resolves the classic non-SLR conflict.'''
+        for test in grammar_test_cases:
+            slr = build_slr_table(test.grammar).to_normal_form()
+            lalr = build_lalr_table(test.grammar).to_normal_form()
+            self.assertEqual(lalr.gotoshifts, slr.gotoshifts)
+            for q, row in lalr.reductions.iteritems():
+                for a, cell in row.iteritems():
+                    self.assertTrue(set(cell) <= set(slr.reductions[q][a]))
+            if test.table is not None:
+                self.assertTrue(lalr.equivalent(test.table), test.filename)
+        G = CFG('''\
+S -> L=R | R
+L -> *R | a
+R -> L
+''')
+        def conflicts(table):
+            return [(q, a) for q, row in table.to_normal_form().reductions.iteritems()
+                    for a, cell in row.iteritems()
+                    if len(cell) + (table.get_shifts(q, a) != []) > 1]
+        self.assertNotEqual(conflicts(build_slr_table(G)), [])
+        self.assertEqual(conflicts(build_lalr_table(G)), [])
+        G = CFG('S -> a | a | Sb')
+        for kind in ('slr', 'lalr'):
+            self.assertEqual(conflicts(build_table(G, kind)), [],
+                             'a repeated rule gives a reduce/reduce conflict')
+        self.assertTrue(build_table(G, 'lalr').equivalent(build_lalr_table(G)))
+        with self.assertRaises(ValueError):
+            build_table(G, 'lr(5)')
+
+    def test_build_lr1_tables(self):
+        '''Show that the canonical and minimal LR(1) tables accept the same
+        language as the SLR table and resolve a conflict which LALR cannot.'''
+        for test in grammar_test_cases:
+            slr = build_slr_table(test.grammar).statistics()
+            for kind in ('lr1', 'minimal-lr1'):
+                stats = build_table(test.grammar, kind).statistics()
+                self.assertGreaterEqual(stats.num_states, slr.num_states)
+                self.assertLessEqual(stats.max_fanout, slr.max_fanout)
+        G = CFG('''\
+S -> aAd | bBd | aBe | bAe
+A -> c
+B -> c
+''')
+        self.assertEqual(build_lalr_table(G).statistics(),
+                         TableStatistics(13, 2, 2))
+        self.assertEqual(build_lr1_table(G).statistics(),
+                         TableStatistics(14, 0, 1))
+        self.assertEqual(build_minimal_lr1_table(G).statistics(),
+                         TableStatistics(14, 0, 1))
+        G = CFG('''\
+E -> E+T | T
+T -> T*F | F
+F -> (E) | a
+''')
+        self.assertEqual(build_lr1_table(G).statistics(),
+                         TableStatistics(22, 0, 1))
+        self.assertEqual(build_minimal_lr1_table(G).statistics(),
+                         TableStatistics(12, 0, 1))
+        self.assertTrue(build_minimal_lr1_table(G).equivalent(build_slr_table(G)))
+
+    def test_compiled_table_files(self):
+        '''Show that compiled tables survive a round trip through a file or a
+        pickle and that load_or_build_table reuses tables stored in a cache
+        directory.'''
+        cache_dir = tempfile.mkdtemp()
+        try:
+            path = os.path.join(cache_dir, 'table')
+            for test in grammar_test_cases:
+                table = build_slr_table(test.grammar).compile()
+                table.save(path)
+                loaded = CompiledParseTable.load(path)
+                self.assertTrue(loaded.equivalent(table), test.filename)
+                self.assertEqual(loaded.productions, table.productions)
+                self.assertEqual(loaded.terminals, table.terminals)
+                unpickled = pickle.loads(pickle.dumps(table, pickle.HIGHEST_PROTOCOL))
+                self.assertTrue(unpickled.equivalent(table), test.filename)
+            os.remove(path)
+            G = grammar_test_cases[0].grammar
+            cached = load_or_build_table(G, cache_dir)
+            self.assertIsInstance(cached, CompiledParseTable)
+            self.assertEqual(os.listdir(cache_dir),
+                             ['slr-%s.table' % G.fingerprint()])
+            self.assertTrue(load_or_build_table(G, cache_dir).equivalent(
+                build_slr_table(G)))
+            lalr = load_or_build_table(G, cache_dir, 'lalr')
+            self.assertTrue(lalr.equivalent(build_lalr_table(G)))
+            self.assertEqual(len(os.listdir(cache_dir)), 2)
+            with open(path, 'wb') as fout:
+                fout.write('not a table')
+            with self.assertRaises(ValueError):
+                CompiledParseTable.load(path)
+            with self.assertRaises(ValueError):
+                load_or_build_table(G, cache_dir, 'lr(5)')
+            # A header which unpickles but lacks fields is corrupt, and the
+            # cached table is rebuilt.
+            header = pickle.dumps({ 'typecode' : 'i' })
+            cached_path = os.path.join(cache_dir, 'slr-%s.table' % G.fingerprint())
+            with open(cached_path, 'wb') as fout:
+                fout.write(CompiledParseTable._MAGIC +
+                           struct.pack('<I', len(header)) + header)
+            with self.assertRaises(ValueError):
+                CompiledParseTable.load(cached_path)
+            self.assertTrue(load_or_build_table(G, cache_dir).equivalent(
+                build_slr_table(G)), 'a corrupt cached table is not rebuilt')
+            new_dir = os.path.join(cache_dir, 'new', 'tables')
+            load_or_build_table(G, new_dir)
+            self.assertEqual(os.listdir(new_dir),
+                             ['slr-%s.table' % G.fingerprint()],
+                             'a missing cache directory is not created')
+        finally:
+            shutil.rmtree(cache_dir)
+
 if __name__ == '__main__':
     unittest.main()
 
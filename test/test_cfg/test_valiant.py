@@ -0,0 +1,43 @@
+from cfg.valiant import *
+from cfg.cyk import CYKGrammar
+from cfg.core import *
+from cfg.cnf import ChomskyNormalForm
+import numpy
+import random
+import unittest
+
+CFG = ContextFreeGrammar
+
+class TestValiant(unittest.TestCase):
+
+    def test_agrees_with_cyk(self):
+        '''Show that the table agrees with the CYK chart for every leaf size,
+        on random strings which are and are not in the language.'''
+        M = CYKGrammar(ChomskyNormalForm(CFG('S -> SS | aSb | ab')))
+        rng = random.Random(0)
+        for length in xrange(1, 34, 2):
+            for t in xrange(3):
+                s = ''
+                while len(s) < length:
+                    s = rng.choice(['a%sb' % s, s + 'ab', 'ab' + s])
+                if t > 0:
+                    s = ''.join(rng.choice('ab') for c in s)
+                w = map(Terminal, s)
+                n = len(w)
+                chart = M.chart(w)
+                for leaf_size in (2, 4, 32):
+                    self.assertEqual(recognize(M, w, leaf_size),
+                                     M.recognize(w), s)
+                    T = valiant_table(M, w, leaf_size)
+                    for l in xrange(1, n + 1):
+                        i = numpy.arange(n - l + 1)
+                        self.assertTrue((T[:, i, i + l].T ==
+                                         chart[i, l - 1]).all())
+        self.assertFalse(recognize(M, map(Terminal, 'ax')))
+        self.assertIsNone(valiant_table(M, map(Terminal, 'ax')))
+        self.assertTrue(recognize(CFG('S -> AB |\nA -> a\nB -> b'), []))
+        with self.assertRaises(ValueError):
+            recognize(M, map(Terminal, 'ab'), 1)
+
+if __name__ == '__main__':
+    unittest.main()
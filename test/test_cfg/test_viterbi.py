@@ -0,0 +1,126 @@
+from cfg.viterbi import *
+from cfg.core import *
+from cfg.glr import glr_parse, enumerate_trees, best_trees, InputNotRecognized
+from cfg.table import build_slr_table
+import math
+import unittest
+from example_grammars import GRA
+
+WEIGHTS = {
+    ProductionRule(Nonterminal('S'), map(Nonterminal, 'NV')) : 0.7,
+    ProductionRule(Nonterminal('S'), map(Nonterminal, 'SP')) : 0.2,
+    ProductionRule(Nonterminal('S'), [Nonterminal('S'), Terminal('a'), Nonterminal('S')]) : 0.1,
+    ProductionRule(Nonterminal('N'), [Terminal('n')]) : 0.4,
+    ProductionRule(Nonterminal('N'), map(Terminal, 'dn')) : 0.3,
+    ProductionRule(Nonterminal('N'), map(Nonterminal, 'NP')) : 0.2,
+    ProductionRule(Nonterminal('N'), [Nonterminal('N'), Terminal('a'), Nonterminal('N')]) : 0.1,
+    ProductionRule(Nonterminal('V'), [Terminal('v'), Nonterminal('N')]) : 0.6,
+    ProductionRule(Nonterminal('V'), [Terminal('v'), Nonterminal('S')]) : 0.4,
+    ProductionRule(Nonterminal('P'), [Terminal('p'), Nonterminal('N')]) : 1.0
+}
+
+def tree_probability(tree):
+    if not tree.subtrees:
+        return 1.0
+    result = WEIGHTS[ProductionRule(tree.symbol, [t.symbol for t in tree.subtrees])]
+    for t in tree.subtrees:
+        result *= tree_probability(t)
+    return result
+
+def vertex_trees(v):
+    # Enumerate the trees of a forest as pairs of a probability and the set
+    # of vertices used.
+    if not v.children:
+        yield 1.0, set([v])
+        return
+    for alt in v.children:
+        p = WEIGHTS[ProductionRule(v.symbol, [c.symbol for c in alt])]
+        partial = [(p, set([v]))]
+        for c in alt:
+            partial = [(p * q, used | used_c) for p, used in partial
+                       for q, used_c in vertex_trees(c)]
+        for result in partial:
+            yield result
+
+class TestViterbi(unittest.TestCase):
+
+    def setUp(self):
+        self.roots = glr_parse(build_slr_table(GRA), map(Terminal, 'nvnanvdnpdn'))
+        self.trees = [t for v in self.roots for t in enumerate_trees(v)]
+
+    def test_most_probable_trees(self):
+        '''Show that best_trees with log probability scores ranks trees by
+        probability, and that a rule without a probability is an error.'''
+        score = log_probability_score(WEIGHTS)
+        # The three most probable trees are equally probable.
+        best = [x for v in self.roots for x in best_trees(v, 3, score)]
+        expected = sorted(self.trees, key=tree_probability, reverse=True)[:3]
+        self.assertEqual(sorted(str(t) for x, t in best),
+                         sorted(map(str, expected)),
+                         'the most probable trees are not found')
+        for (log_probability, tree) in best:
+            self.assertAlmostEqual(log_probability,
+                                   math.log(tree_probability(tree)))
+        score = log_probability_score(dict(WEIGHTS.items()[1:]))
+        with self.assertRaises(ValueError):
+            best_trees(self.roots[0], 1, score)
+
+    def test_best_tree(self):
+        '''Show that best_tree finds the most probable tree over all roots,
+        as found by scoring every tree.'''
+        log_probability, tree = best_tree(self.roots, WEIGHTS)
+        expected = max(map(tree_probability, self.trees))
+        self.assertAlmostEqual(log_probability, math.log(expected),
+                               msg='best_tree does not find the most probable tree')
+        self.assertAlmostEqual(tree_probability(tree), expected,
+                               msg='the tree does not have its reported probability')
+        weights = dict(WEIGHTS)
+        weights[ProductionRule(Nonterminal('N'), [Terminal('n')])] = 0.0
+        with self.assertRaises(ValueError):
+            best_tree(self.roots, weights)
+
+    def test_cyclic_forest(self):
+        '''Show that the most probable tree of a cyclic forest does not go
+        around a cycle, and that inside-outside rejects cyclic forests.'''
+        G = ContextFreeGrammar('''\
+S -> A | b
+A -> S | a
+''')
+        weights = dict((p, 0.5) for p in G.productions)
+        roots = glr_parse(build_slr_table(G), map(Terminal, 'a'))
+        [(log_probability, tree)] = best_trees(roots[0], 1,
+                                               log_probability_score(weights))
+        self.assertEqual(str(tree), 'S(A(a))',
+                         'the most probable tree goes around a cycle')
+        self.assertAlmostEqual(log_probability, math.log(0.25))
+        self.assertEqual(best_tree(roots, weights), (log_probability, tree))
+        weights[ProductionRule(Nonterminal('A'), [Nonterminal('S')])] = 2.0
+        with self.assertRaises(ValueError):
+            best_tree(roots, weights)
+        with self.assertRaises(ValueError):
+            inside_outside(roots, weights)
+
+    def test_inside_outside(self):
+        '''Show that the marginal probabilities of the vertices agree with
+        those found by enumerating every tree.'''
+        total, marginals = inside_outside(self.roots, WEIGHTS)
+        self.assertAlmostEqual(total, sum(map(tree_probability, self.trees)),
+                               msg='the total probability of the trees is wrong')
+        for v in self.roots:
+            self.assertAlmostEqual(marginals[v], 1.0)
+        for u, p in marginals.iteritems():
+            self.assertTrue(-1e-9 <= p <= 1 + 1e-9)
+            if not u.children:
+                self.assertAlmostEqual(p, 1.0)
+        expected = {}
+        for v in self.roots:
+            for p, used in vertex_trees(v):
+                for u in used:
+                    expected[u] = expected.get(u, 0.0) + p / total
+        self.assertEqual(set(expected), set(marginals))
+        for u, p in expected.iteritems():
+            self.assertAlmostEqual(marginals[u], p,
+                                   msg='a marginal probability is wrong')
+
+if __name__ == '__main__':
+    unittest.main()